@@ -2,10 +2,15 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
+import asyncio
 import uvicorn
 
-from routes import fs_routes, report_routes, query_routes, artifact_routes, auth_routes
+from routes import fs_routes, report_routes, query_routes, artifact_routes, auth_routes, admin_routes
 from utils.fs_utils import DATA_DIR, FS_DATA_FILE, FILE_STORAGE_PATH, save_fs_data, FILE_DELETED_PATH, FILE_CACHE_PATH
+from utils.cache_utils import run_cache_janitor, query_result_writer
+from utils.engine_utils import close_sql_engines
+from utils.executor_utils import start_executors, shutdown_executors, run_in_executor
+from utils.sandbox_utils import start_sandbox, shutdown_sandbox
 
 app = FastAPI()
 
@@ -23,16 +28,20 @@ app.include_router(fs_routes.router, prefix="/api")
 app.include_router(report_routes.router, prefix="/api")
 app.include_router(query_routes.router, prefix="/api")
 app.include_router(artifact_routes.router, prefix="/api")
+app.include_router(admin_routes.router, prefix="/api")
 app.include_router(auth_routes.router)  # auth_routes已设置prefix="/api/auth"
 
 # 注册静态文件服务（假设前端构建文件在./dist目录）
 app.mount("/", StaticFiles(directory="./dist", html=True), name="static")
 
+# 后台任务(如缓存清理)，关闭时取消
+background_tasks = []
+
 # 启动初始化：如果数据文件不存在，创建一个空的文件系统
 
 
 @app.on_event("startup")
-def startup_event():
+async def startup_event():
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR, exist_ok=True)
 
@@ -46,7 +55,34 @@ def startup_event():
         os.makedirs(FILE_CACHE_PATH, exist_ok=True)
 
     if not os.path.exists(FS_DATA_FILE):
-        save_fs_data([])
+        await save_fs_data([])
+
+    # 创建进程共享的执行器
+    start_executors()
+
+    # 预先启动执行用户代码的沙箱 worker(导入常用库)
+    await run_in_executor("cpu", start_sandbox)
+
+    # 后台清理查询结果缓存
+    background_tasks.append(asyncio.create_task(run_cache_janitor()))
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in background_tasks:
+        task.cancel()
+
+    # 关闭数据库连接池
+    await close_sql_engines()
+
+    # 等待排队中的查询结果写入完成
+    await run_in_executor("cpu", query_result_writer.shutdown)
+
+    # 终止沙箱 worker，等待中的请求随即返回错误
+    await run_in_executor("cpu", shutdown_sandbox)
+
+    # 停止执行器(会等待执行器自身的线程，不能在执行器中运行)
+    await asyncio.get_running_loop().run_in_executor(None, shutdown_executors)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from typing import Dict, Optional, List, Union, Literal
-from models.query_models import Alert
+from models.query_models import Alert, LimitExceeded
 
 
 class PlainParamValue(BaseModel):
@@ -19,6 +19,10 @@ class ArtifactRequest(BaseModel):
     inferredParamValues: Dict[str, Union[str, List[str]]]
     pyCode: str
     engine: str
+    # 本次执行的超时时间(秒)，未指定时使用默认值
+    timeout: Optional[float] = None
+    # 忽略缓存的执行结果，强制重新执行
+    forceRefresh: bool = False
 
 
 class ArtifactTextDataContext(BaseModel):
@@ -87,6 +91,10 @@ class ArtifactResponse(BaseModel):
     codeContext: ArtifactCodeContext
     dataContext: Optional[ArtifactDataContext] = None
     queryTime: str
+    # 代码超出资源限制时的详细信息
+    limitExceeded: Optional[LimitExceeded] = None
+    # 是否复用了相同代码、输入与参数的执行结果
+    cacheHit: bool = False
 
 
 class ArtifactCodeResponse(BaseModel):
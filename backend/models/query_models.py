@@ -17,6 +17,12 @@ class Alert(BaseModel):
     message: str
 
 
+class LimitExceeded(BaseModel):
+    # 超出的资源限制: memory(MB)/cpu(秒)/wall(秒)/output(MB)
+    limit: Literal['memory', 'cpu', 'wall', 'output']
+    value: float
+
+
 class QueryResponseDataContext(BaseModel):
     rowNumber: int = 0
     demoData: str = ""
@@ -45,6 +51,11 @@ class QueryResponse(BaseModel):
     cascaderContext: Optional[CascaderContext] = None
     inferredContext: Optional[InferredContext] = None
     queryTime: str
+    # 是否复用了已有的查询结果，以及该结果的年龄(秒)
+    cacheHit: bool = False
+    cacheAge: Optional[float] = None
+    # Python 代码超出资源限制时的详细信息
+    limitExceeded: Optional[LimitExceeded] = None
 
 
 class QueryBySQLRequestContext(BaseModel):
@@ -56,6 +67,10 @@ class QueryBySQLRequestContext(BaseModel):
     code: str
     parsedCode: str
     paramValues: Optional[Dict[str, Any]] = None
+    # 本次查询的超时时间(秒)
+    timeout: Optional[float] = None
+    # results 引擎: 数据源别名 -> 已执行的查询结果ID
+    dfAliasUniqueIds: Optional[Dict[str, str]] = None
 
 
 class QueryByPythonRequestContext(BaseModel):
@@ -67,6 +82,8 @@ class QueryByPythonRequestContext(BaseModel):
     code: str
     parsedCode: str
     paramValues: Optional[Dict[str, Any]] = None
+    # 本次查询的超时时间(秒)
+    timeout: Optional[float] = None
 
 
 class QueryByCsvDataRequestContext(BaseModel):
@@ -94,3 +111,5 @@ class QueryRequest(BaseModel):
     ]
     cascaderContext: CascaderContext
     inferredContext: InferredContext
+    # 忽略可复用的查询结果，强制重新查询
+    forceRefresh: bool = False
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any, Union, Literal
+from models.engine_models import ExecutionLimits
 
 # UpdateMode 相关模型
 
@@ -209,6 +210,8 @@ class Report(BaseModel):
     parameters: List[Parameter] = []
     artifacts: List[Artifact] = []
     layout: Layout
+    # 报表内 Python 数据源的资源限制，优先于引擎配置
+    limits: Optional[ExecutionLimits] = None
     createdAt: str
     updatedAt: str
 
@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Depends, HTTPException
+from routes.auth_routes import verify_token_dependency
+from utils.executor_utils import executor_stats, run_in_executor
+from utils.sandbox_utils import sandbox_pool
+from utils.engine_utils import sql_engine, mysql_pools
+from utils.artifact_utils import artifact_result_cache
+from utils.cache_utils import query_result_memory_cache, filter_index_cache, query_result_writer, get_query_cache_occupancy, collect_query_cache_garbage
+
+router = APIRouter(tags=["admin"])
+
+
+@router.get("/admin/cache/stats")
+async def get_cache_stats(username: str = Depends(verify_token_dependency)):
+    """
+    查询结果缓存的状态，需要验证token
+    """
+    return {
+        "memory": query_result_memory_cache.stats(),
+        "disk": await run_in_executor("cpu", get_query_cache_occupancy),
+        "filterIndex": filter_index_cache.stats(),
+        "writer": query_result_writer.stats(),
+        "artifacts": artifact_result_cache.stats(),
+    }
+
+
+@router.post("/admin/cache/gc")
+async def run_cache_gc(username: str = Depends(verify_token_dependency)):
+    """
+    立即按清理策略清理查询结果缓存，需要验证token
+    """
+    return await run_in_executor("cpu", collect_query_cache_garbage)
+
+
+@router.get("/admin/engine/stats")
+async def get_engine_stats(username: str = Depends(verify_token_dependency)):
+    """
+    查询引擎的状态(连接池、执行器、沙箱进程等)，需要验证token
+    """
+    return {
+        "engines": sql_engine.stats(),
+        "mysqlPools": mysql_pools.stats(),
+        "executors": executor_stats(),
+        "sandbox": sandbox_pool.stats(),
+    }
+
+
+@router.post("/admin/engine/reload")
+async def reload_engines(username: str = Depends(verify_token_dependency)):
+    """
+    重新加载引擎配置文件，需要验证token
+    """
+    try:
+        return {"engines": sql_engine.reload()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
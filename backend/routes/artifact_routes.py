@@ -1,80 +1,59 @@
-import json
 from fastapi import APIRouter
-from pathlib import Path
-import pandas as pd
-import io
-import io
-import base64
-from typing import Literal, Any
 from datetime import datetime
-from utils.fs_utils import FILE_CACHE_PATH
-from contextlib import redirect_stdout
-from functools import reduce
-
-from models.artifact_models import ArtifactRequest, ArtifactResponse, ArtifactCodeContext, ArtifactTextDataContext, ArtifactPlotlyDataContext, ArtifactEChartDataContext, ArtifactImageDataContext, ArtifactAltairDataContext, ArtifactCodeResponse, ArtifactTableDataContext, ArtifactPerspectiveDataContext
-from models.query_models import Alert
-from models.artifact_models import PlainParamValue
+from typing import Dict
+from utils.cache_utils import wait_query_result_written, get_query_result_version
+from utils.artifact_utils import ARTIFACT_TIMEOUT, ArtifactCodeError, DataSourceLoadError, run_artifact_task, build_artifact_code, load_artifact_dataframes, compute_artifact_key, artifact_result_cache
+from utils.executor_utils import run_in_executor
+from utils.query_utils import run_single_flight
+from utils.sandbox_utils import SandboxLimitError, resolve_execution_limits, run_in_sandbox
+from utils.engine_utils import sql_engine
+
+from models.artifact_models import ArtifactRequest, ArtifactResponse, ArtifactCodeContext, ArtifactCodeResponse
+from models.engine_models import ExecutionLimits
+from models.query_models import Alert, LimitExceeded
 
 router = APIRouter(tags=["artifact"])
 
 
-def load_query_result(uniqueId: str) -> pd.DataFrame:
-    """加载查询结果"""
-    try:
-        with open(Path(FILE_CACHE_PATH) / f"{uniqueId}.data", "r") as f:
-            return pd.read_json(f)
-    except Exception as e:
-        raise ValueError(f"Failed to load query result: {str(e)}")
-
+async def wait_artifact_dataframes(dfAliasUniqueIds: Dict[str, str]):
+    """
+    等待 artifact 依赖的数据源查询结果写入完成
 
-def convert_plain_param_value(value: str, valueType: Literal['string', 'double', 'boolean', 'int']) -> Any:
-    try:
-        """转换普通参数值"""
-        if valueType == 'string':
-            return str(value)
-        elif valueType == 'double':
-            return float(value)
-        elif valueType == 'boolean':
-            return bool(value)
-        elif valueType == 'int':
-            return int(value)
-    except Exception as e:
-        raise ValueError(
-            f"[PARAMS] Invalid plain param value: {value}, should be a {valueType}, with error: {str(e)}")
+    Raises:
+        DataSourceLoadError: 某个数据源的结果写入失败或超时
+    """
+    for alias, uniqueId in dfAliasUniqueIds.items():
+        try:
+            await wait_query_result_written(uniqueId)
+        except Exception as e:
+            raise DataSourceLoadError(alias, str(e))
 
 
 @router.post("/execute_artifact", response_model=ArtifactResponse)
 async def execute_artifact(request: ArtifactRequest):
     """
-    执行可视化代码并返回结果
+    执行可视化代码并返回结果；代码在沙箱 worker 进程中运行，不阻塞事件循环；
+    代码、依赖的查询结果与参数都相同时，直接返回缓存的执行结果
     """
-    alerts = []
     try:
-        # 加载所有依赖的数据源查询结果
-        dfs = {}
-        for alias, uniqueId in request.dfAliasUniqueIds.items():
-            try:
-                df = load_query_result(uniqueId)
-                dfs[alias] = df
-            except Exception as e:
-                return ArtifactResponse(
-                    queryTime=datetime.now().isoformat(),
-                    status="error",
-                    message=f"[PYTHON]Failed to load data source {alias}: {str(e)}",
-                    error=str(e),
-                    alerts=[
-                        Alert(type="error", message=f"Failed to load data source {alias}: {str(e)}")],
-                    codeContext=ArtifactCodeContext(**request.dict())
-                )
-        # 构建代码执行环境
-        code = request.pyCode
-        engine = request.engine
+        # 数据源在 worker 中直接从缓存文件加载
+        try:
+            await wait_artifact_dataframes(request.dfAliasUniqueIds)
+        except DataSourceLoadError as e:
+            alias, error = e.alias, e.error
+            return ArtifactResponse(
+                queryTime=datetime.now().isoformat(),
+                status="error",
+                message=f"[PYTHON]Failed to load data source {alias}: {error}",
+                error=error,
+                alerts=[
+                    Alert(type="error", message=f"Failed to load data source {alias}: {error}")],
+                codeContext=ArtifactCodeContext(**request.dict())
+            )
 
         # 判断引擎
-        result = None
-        if engine != "default":
-            raise ValueError(f"Unsupported engine: {engine}")
-            # 执行Python代码
+        if request.engine != "default":
+            raise ValueError(f"Unsupported engine: {request.engine}")
     except Exception as e:
         return ArtifactResponse(
             queryTime=datetime.now().isoformat(),
@@ -85,128 +64,76 @@ async def execute_artifact(request: ArtifactRequest):
             codeContext=ArtifactCodeContext(**request.dict())
         )
 
-    try:
-        # cascader_params 处理
-        for param_name, param_values in request.cascaderParamValues.items():
-            df_alias, df_columns = param_name.split(
-                ",")[0], param_name.split(",")[1:]
-
-            # 对于cascader_params, 如果参数值为空, 则默认为全选
-            if len(param_values) == 0 or len(param_values[0]) == 0:
-                continue
-
-            df_selected_list = []
-            for param_value in param_values:
-                conds = [dfs[df_alias][column].astype(str) == param_value[idx] for idx, column in enumerate(
-                    df_columns) if idx < len(param_value)]
-                df_index = reduce(lambda x, y: x & y, conds)
-                df_selected_list.append(dfs[df_alias].loc[df_index])
-            dfs[df_alias] = pd.concat(df_selected_list)
-
-        # 对于inferred_params, 进行类型转换
-        for param_name, param_value in request.inferredParamValues.items():
-            df_alias, df_column = param_name.split('.')[:2]
-            df_index = dfs[df_alias][df_column].fillna(
-                '').astype(str).str.lower().isin(param_value)
-            dfs[df_alias] = dfs[df_alias].loc[df_index]
+    # 资源限制: 引擎配置，请求中的超时时间优先
+    limits = resolve_execution_limits(
+        ExecutionLimits(wallSeconds=ARTIFACT_TIMEOUT), sql_engine.get_limits(request.engine),
+        ExecutionLimits(wallSeconds=request.timeout or None))
+    # 依赖的查询结果以当前版本计入缓存键，结果被替换后不再复用
+    cache_key = compute_artifact_key(
+        request.pyCode, request.engine,
+        {alias: get_query_result_version(uniqueId)
+         for alias, uniqueId in request.dfAliasUniqueIds.items()},
+        request.plainParamValues, request.cascaderParamValues, request.inferredParamValues)
+    cached = artifact_result_cache.get(cache_key) \
+        if cache_key is not None and not request.forceRefresh else None
+    if cached is not None:
+        data_context, captured_output, alerts = cached
+        return ArtifactResponse(
+            status="success",
+            message=captured_output if captured_output else "Artifact executed successfully",
+            alerts=alerts,
+            codeContext=ArtifactCodeContext(**request.dict()),
+            dataContext=data_context,
+            queryTime=datetime.now().isoformat(),
+            cacheHit=True
+        )
 
-        # 对于plain_params, 进行类型转换
-        plain_param_values = {}
-        for param_name, param_value in request.plainParamValues.items():
-            if isinstance(param_value, PlainParamValue) and param_value.type == 'single' and isinstance(param_value.value, str):
-                plain_param_values[param_name] = convert_plain_param_value(
-                    param_value.value, param_value.valueType)
-            elif isinstance(param_value, PlainParamValue) and param_value.type == 'multiple' and isinstance(param_value.value, list):
-                plain_param_values[param_name] = [convert_plain_param_value(
-                    value, param_value.valueType) for value in param_value.value]
-            else:
-                raise ValueError(
-                    f"[PARAMS] Invalid plain param value: {param_value}, should be a list or a string.")
+    # 依赖相同查询结果的 artifact 优先在同一个沙箱 worker 中执行，复用其中已加载的 DataFrame
+    affinity = ",".join(sorted(set(request.dfAliasUniqueIds.values()))) or None
 
-        # 创建本地变量空间，包含DataFrame对象和参数
-        local_vars = {
-            **dfs,  # 数据源
-            **plain_param_values
-        }
+    def execute():
+        return run_in_sandbox(
+            "artifact", run_artifact_task, request.pyCode, request.dfAliasUniqueIds, request.plainParamValues,
+            request.cascaderParamValues, request.inferredParamValues, limits=limits, affinity=affinity)
 
-        # 创建输出捕获
-        text_output = io.StringIO()
-        try:
-            with redirect_stdout(text_output):
-                exec(code, local_vars)
-        except Exception as e:
-            return ArtifactResponse(
-                queryTime=datetime.now().isoformat(),
-                status="error",
-                message=text_output.getvalue(),
-                error=f"[PYTHON CODE] {type(e)}: " + str(e),
-                alerts=[Alert(type="error", message=str(e))],
-                codeContext=ArtifactCodeContext(**request.dict())
-            )
-
-        # 获取捕获的输出
-        captured_output = text_output.getvalue()
-        # 检查是否有输出结果变量
-        if "result" in local_vars:
-            result = local_vars["result"]
-            # 根据结果类型返回不同的数据上下文
-            if isinstance(result, str):
-                data_context = ArtifactTextDataContext(
-                    type="text", data=result)
-            # elif isinstance(result, plotly.graph_objs._figure.Figure):
-            elif 'plotly' in str(type(result)):
-                data_context = ArtifactPlotlyDataContext(
-                    type="plotly", data=result.to_json())
-            elif 'pyecharts' in str(type(result)):
-                data_context = ArtifactEChartDataContext(
-                    type="echart", data=result.dump_options())
-            elif 'matplotlib' in str(type(result)):
-                # 将图表保存为BytesIO对象
-                buf = io.BytesIO()
-                result.savefig(buf, format='png')
-                buf.seek(0)
-                base64_image = base64.b64encode(buf.read()).decode('utf-8')
-                buf.close()
-                data_context = ArtifactImageDataContext(
-                    type="image", data=base64_image)
-            elif isinstance(result, bytes):
-                # 处理直接返回图片 bytes 的情况（如 screenshot_bytes）
-                base64_image = base64.b64encode(result).decode('utf-8')
-                data_context = ArtifactImageDataContext(
-                    type="image", data=base64_image)
-            elif 'altair' in str(type(result)):
-                data_context = ArtifactAltairDataContext(
-                    type="altair", data=json.dumps(result.to_dict()))
-            elif "pandas.core.frame.DataFrame" in str(type(result)):
-                data_context = ArtifactTableDataContext(
-                    type="table", data=result.to_json(orient='records', date_format='iso', force_ascii=False))
-            # elif 'PerspectiveWidget' in str(type(result)):
-            #     widget_df = result.table.view().to_pandas()
-            #     widget_config = json.dumps(result.save())
-            #     data_context = ArtifactPerspectiveDataContext(
-            #         type="perspective", data=widget_df.to_json(orient='records', date_format='iso', force_ascii=False), config=widget_config)
-            elif type(result) == tuple and len(result) == 2 and "pandas.core.frame.DataFrame" in str(type(result[0])) and type(result[1]) == dict:
-                # table = perspective.table(result[0])
-                # widget_df = table.view().to_pandas()
-                widget_df = result[0].reset_index()
-                widget_config = json.dumps(result[1])
-
-                data_context = ArtifactPerspectiveDataContext(
-                    type="perspective", data=widget_df.to_json(orient='records', date_format='iso', force_ascii=False), config=widget_config)
-            else:
-                # 默认转换为文本
-                data_context = ArtifactTextDataContext(
-                    type="text", data=str(result))
+    try:
+        # 相同的 artifact 正在执行时等待其结果
+        if cache_key is not None:
+            data_context, captured_output, alerts = await run_single_flight(f"artifact:{cache_key}", execute)
+            artifact_result_cache.put(
+                cache_key, (data_context, captured_output, alerts))
         else:
-            # 如果没有result变量，返回标准输出内容
-            if captured_output:
-                data_context = ArtifactTextDataContext(
-                    type="text", data=captured_output)
-            else:
-                data_context = None
-                alerts.append(
-                    Alert(type="warning", message="No result or output from code execution"))
-
+            data_context, captured_output, alerts = await execute()
+    except DataSourceLoadError as e:
+        return ArtifactResponse(
+            queryTime=datetime.now().isoformat(),
+            status="error",
+            message=f"[PYTHON]Failed to load data source {e.alias}: {e.error}",
+            error=e.error,
+            alerts=[
+                Alert(type="error", message=f"Failed to load data source {e.alias}: {e.error}")],
+            codeContext=ArtifactCodeContext(**request.dict())
+        )
+    except SandboxLimitError as e:
+        message = f"[PYTHON CODE] {e}"
+        return ArtifactResponse(
+            queryTime=datetime.now().isoformat(),
+            status="error",
+            message=message,
+            error=message,
+            alerts=[Alert(type="error", message=message)],
+            codeContext=ArtifactCodeContext(**request.dict()),
+            limitExceeded=LimitExceeded(limit=e.limit, value=e.value)
+        )
+    except ArtifactCodeError as e:
+        return ArtifactResponse(
+            queryTime=datetime.now().isoformat(),
+            status="error",
+            message=e.output,
+            error=f"[PYTHON CODE] {e.error_type}: " + e.error,
+            alerts=[Alert(type="error", message=e.error)],
+            codeContext=ArtifactCodeContext(**request.dict())
+        )
     except Exception as e:
         return ArtifactResponse(
             queryTime=datetime.now().isoformat(),
@@ -236,73 +163,26 @@ async def artifact_code(request: ArtifactRequest):
     """
     alerts = []
     # 加载所有依赖的数据源查询结果
-    dfs = {}
-    for alias, uniqueId in request.dfAliasUniqueIds.items():
-        try:
-            df = load_query_result(uniqueId)
-            dfs[alias] = df
-        except Exception as e:
-            return ArtifactCodeResponse(
-                queryTime=datetime.now().isoformat(),
-                status="error",
-                message=f"[PYTHON]Failed to load data source {alias}: {str(e)}",
-                error=str(e),
-                alerts=[
-                    Alert(type="error", message=f"Failed to load data source {alias}: {str(e)}")],
-                pyCode=""
-            )
     try:
-        # cascader_params 处理
-        for param_name, param_values in request.cascaderParamValues.items():
-            df_alias, df_columns = param_name.split(
-                ",")[0], param_name.split(",")[1:]
-
-            # 对于cascader_params, 如果参数值为空, 则默认为全选
-            if len(param_values) == 0 or len(param_values[0]) == 0:
-                continue
-
-            df_selected_list = []
-            for param_value in param_values:
-                conds = [dfs[df_alias][column].astype(str) == param_value[idx] for idx, column in enumerate(
-                    df_columns) if idx < len(param_value)]
-                df_index = reduce(lambda x, y: x & y, conds)
-                df_selected_list.append(dfs[df_alias].loc[df_index])
-            dfs[df_alias] = pd.concat(df_selected_list)
-
-        # 对于inferred_params, 进行类型转换
-        for param_name, param_value in request.inferredParamValues.items():
-            df_alias, df_column = param_name.split('.')[:2]
-            df_index = dfs[df_alias][df_column].fillna(
-                '').astype(str).str.lower().isin(param_value)
-            dfs[df_alias] = dfs[df_alias].loc[df_index]
-
-        # 对于plain_params, 进行类型转换
-        plain_param_values = {}
-        for param_name, param_value in request.plainParamValues.items():
-            if isinstance(param_value, PlainParamValue) and param_value.type == 'single' and isinstance(param_value.value, str):
-                plain_param_values[param_name] = convert_plain_param_value(
-                    param_value.value, param_value.valueType)
-            elif isinstance(param_value, PlainParamValue) and param_value.type == 'multiple' and isinstance(param_value.value, list):
-                plain_param_values[param_name] = [convert_plain_param_value(
-                    value, param_value.valueType) for value in param_value.value]
-            else:
-                raise ValueError(
-                    f"[PARAMS] Invalid plain param value: {param_value}, should be a list or a string.")
-
-        print(1)
-        # import
-        import_context = "# import\n" + "import io\n" + \
-            "import json\n" + "import pandas as pd\n"
-        print(2)
-        # data
-        data_context = "# data\n" + \
-            "\n".join([f"{df_alias} = pd.read_json(io.StringIO({repr(df_value.to_json(orient='records', date_format='iso', force_ascii=False).strip())}))" for df_alias, df_value in dfs.items()])
-        print(3)
-        # param
-        params_context = "# params\n" + \
-            f"globals().update(json.loads(\"\"\"{json.dumps(plain_param_values)}\"\"\"))"
-        pyCode = import_context + "\n\n" + params_context + "\n\n" + \
-            data_context + "\n\n" + "# code\n" + request.pyCode
+        await wait_artifact_dataframes(request.dfAliasUniqueIds)
+        dfs, full = await run_in_executor(
+            "cpu", load_artifact_dataframes, request.dfAliasUniqueIds,
+            request.cascaderParamValues, request.inferredParamValues)
+    except DataSourceLoadError as e:
+        alias, error = e.alias, e.error
+        return ArtifactCodeResponse(
+            queryTime=datetime.now().isoformat(),
+            status="error",
+            message=f"[PYTHON]Failed to load data source {alias}: {error}",
+            error=error,
+            alerts=[
+                Alert(type="error", message=f"Failed to load data source {alias}: {error}")],
+            pyCode=""
+        )
+    try:
+        pyCode = await run_in_executor(
+            "cpu", build_artifact_code, request.pyCode, dfs, request.plainParamValues,
+            request.cascaderParamValues, request.inferredParamValues, full)
     except Exception as e:
         return ArtifactCodeResponse(
             queryTime=datetime.now().isoformat(),
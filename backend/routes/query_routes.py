@@ -1,39 +1,72 @@
-from concurrent.futures import ThreadPoolExecutor
 import asyncio
 import json
 import os
-from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request
+from fastapi.responses import StreamingResponse
 from datetime import datetime
-from typing import Dict, Any, Optional, List
-from models.query_models import QueryRequest, QueryResponse, QueryResponseDataContext, QueryResponseCodeContext, Alert
+from typing import Dict, Any, Optional, List, Literal
+from models.query_models import (
+    QueryRequest,
+    QueryResponse,
+    QueryResponseDataContext,
+    QueryResponseCodeContext,
+    Alert,
+    LimitExceeded,
+)
 from models.report_models import Report
 from utils.report_utils import get_report_content
 from pathlib import Path
-from utils.fs_utils import FILE_CACHE_PATH
+from utils.cache_utils import (
+    load_query_result,
+    load_query_result_head,
+    link_query_result,
+    get_query_result_age,
+    read_query_result_page,
+    query_result_writer,
+    wait_query_result_written,
+    load_query_stats,
+    save_query_stats,
+    get_query_stats,
+    get_query_result_version,
+)
+from utils.query_utils import (
+    compute_content_key,
+    get_reuse_ttl,
+    get_max_rows,
+    run_single_flight,
+    run_cancellable,
+    request_query_cancel,
+    execute_python_source,
+)
+from utils.executor_utils import run_in_executor
+from utils.sandbox_utils import SandboxLimitError, resolve_execution_limits, run_in_sandbox
+from utils.engine_utils import RowLimitExceededError, referenced_views, sql_engine
+from utils.stats_utils import (
+    STATS_LOW_CARDINALITY,
+    compute_query_stats,
+    get_cascader_key,
+    get_inferred_values,
+)
 import pandas as pd
 from routes.auth_routes import verify_token_dependency
 
 import pandas as pd
-from io import StringIO
+from io import StringIO, BytesIO
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.ipc as pa_ipc
 
 
 router = APIRouter(tags=["query"])
 
-
-def save_query_result(uniqueId: str, result: str):
-    with open(Path(FILE_CACHE_PATH) / f"{uniqueId}.data", "w") as f:
-        json.dump(json.loads(result), f)
-
-
-def load_query_result(uniqueId: str) -> pd.DataFrame:
-    with open(Path(FILE_CACHE_PATH) / "cachedData" / f"{uniqueId}.data", "r") as f:
-        return pd.read_json(f)
+# 分页接口单页最大行数
+MAX_PAGE_ROWS = 50000
 
 
 @router.post("/query_by_source_id", response_model=QueryResponse)
-async def query_by_source_id(request: QueryRequest, username: str = Depends(verify_token_dependency)):
+async def query_by_source_id(request: QueryRequest, http_request: Request, username: str = Depends(verify_token_dependency)):
     """
-    根据数据源ID执行查询，需要验证token
+    根据数据源ID执行查询，需要验证token；客户端断开或查询被取消时，终止执行中的查询
     """
     alerts = []
     code_context = construct_response_code_context(request, request.uniqueId)
@@ -76,32 +109,86 @@ async def query_by_source_id(request: QueryRequest, username: str = Depends(veri
         # 根据数据源类型执行不同的查询
         result = None
         request_type = request.requestContext.type
-
+        max_rows = get_max_rows(data_source)
         if request_type == "sql":
+            # SQL 查询的行数上限还取决于引擎配置，复用结果时同样需要检查
+            sql_executor = sql_engine[request.requestContext.engine]
+            max_rows = get_max_rows(data_source, sql_executor.config.maxRows)
+
+        # 相同引擎、相同代码的查询共享结果，在有效期内直接复用
+        content_key = None
+        cache_hit = False
+        cache_age = None
+        # 查询结果的统计信息，用于构造 cascaderContext 与 inferredContext
+        stats = None
+        stats_changed = False
+        # results 引擎: 查询引用的已执行数据源(别名 -> 查询结果ID)
+        views = referenced_views(request.requestContext.parsedCode, request.requestContext.dfAliasUniqueIds) \
+            if request_type == "sql" else None
+        if request_type in ("sql", "python"):
+            inputs = None
+            if views:
+                # 依赖的结果以当前版本计入内容键，上游重新执行后不再复用旧结果
+                for view_unique_id in views.values():
+                    await wait_query_result_written(view_unique_id, raise_error=False)
+                inputs = {alias: get_query_result_version(view_unique_id)
+                          for alias, view_unique_id in views.items()}
+            content_key = compute_content_key(
+                request_type, request.requestContext.engine, request.requestContext.parsedCode, inputs)
+            # 相同内容的结果可能仍在后台写入
+            await wait_query_result_written(content_key, raise_error=False)
+            cache_age = get_query_result_age(content_key)
+            if not request.forceRefresh and cache_age is not None and cache_age <= get_reuse_ttl(data_source):
+                try:
+                    # 内容键不包含行数上限，结果行数超过当前数据源的上限时与重新查询一样报错
+                    stats = await run_in_executor("cpu", load_query_stats, content_key)
+                    if stats is not None and stats["rowCount"] > max_rows:
+                        raise RowLimitExceededError(max_rows)
+                    await wait_query_result_written(request.uniqueId, raise_error=False)
+                    link_query_result(content_key, request.uniqueId)
+                    stats = await run_in_executor("cpu", load_query_stats, request.uniqueId)
+                    # 统计信息足以构造全部 context 时，无需加载整个结果
+                    if not stats_cover_contexts(
+                            stats, request.inferredContext.required, request.cascaderContext.required):
+                        result = await run_in_executor("cpu", load_query_result, request.uniqueId)
+                    cache_hit = True
+                except FileNotFoundError:
+                    # 结果恰好被清理，重新查询
+                    result = None
+                    stats = None
+            if not cache_hit:
+                cache_age = None
+
+        if cache_hit:
+            # 已复用查询结果，无需执行
+            pass
+        elif request_type == "sql":
             code = request.requestContext.parsedCode
-            engine = request.requestContext.engine
-            # 执行SQL查询
-            from engine_config import sql_engine
-            result = await sql_engine[engine](code)
+            # 执行SQL查询，相同的查询正在执行时等待其结果；行数上限在读取结果时生效
+            result = await run_cancellable(
+                request.uniqueId, content_key, http_request,
+                with_timeout(run_single_flight(
+                    f"{content_key}:{max_rows}", lambda: sql_executor(code, max_rows, views)),
+                    request.requestContext.timeout))
 
         elif request_type == "python":
             code = request.requestContext.parsedCode
             engine = request.requestContext.engine
+            # 资源限制: 数据源配置优先，其次为报表配置，再次为引擎配置
+            limits = resolve_execution_limits(
+                sql_engine.get_limits(engine), report.limits, (data_source.config or {}).get("limits"))
 
-            def python_execute_async():
-                global_vars = {}
-                exec(code, global_vars)
-                result = global_vars.get('result')
-                return result
-
-            loop = asyncio.get_event_loop()
-            with ThreadPoolExecutor() as pool:
-                result = await loop.run_in_executor(pool, python_execute_async)
+            # 在沙箱 worker 中执行，超时、超出资源限制或取消时终止 worker
+            result = await run_cancellable(
+                request.uniqueId, content_key, http_request,
+                with_timeout(run_single_flight(
+                    content_key, lambda: run_in_sandbox("python", execute_python_source, code, limits=limits)),
+                    request.requestContext.timeout))
 
         elif request_type == "csv_uploader":
             dataContent = request.requestContext.dataContent
             # 使用 StringIO 读取 CSV 文本
-            result = pd.read_csv(StringIO(dataContent))
+            result = await run_in_executor("cpu", pd.read_csv, StringIO(dataContent))
         elif request_type == "csv_data":
             data_source = next(
                 (ds for ds in report.dataSources if ds.id ==
@@ -116,7 +203,7 @@ async def query_by_source_id(request: QueryRequest, username: str = Depends(veri
                     alerts=[
                         Alert(type="error", message="Data source not found")]
                 )
-            result = pd.read_csv(StringIO(data_source.executor.data))
+            result = await run_in_executor("cpu", pd.read_csv, StringIO(data_source.executor.data))
         else:
             return QueryResponse(
                 status="error",
@@ -126,29 +213,54 @@ async def query_by_source_id(request: QueryRequest, username: str = Depends(veri
                     Alert(type="error", message=f"Unsupported executor type: {request_type}")]
             )
 
-        if result is not None and isinstance(result, pd.DataFrame):
-            if result.shape[0] > 500000:
-                raise ValueError("[Query] 数据行数超过50万，请减少查询范围")
-            save_query_result(request.uniqueId,
-                              result.to_json(orient='records'))
+        if result is not None and isinstance(result, pd.DataFrame) and not cache_hit:
+            # SQL 查询已在读取时检查，这里覆盖 python 与 csv 数据源
+            if result.shape[0] > max_rows:
+                raise RowLimitExceededError(max_rows)
+        elif cache_hit and stats is None and isinstance(result, pd.DataFrame):
+            if result.shape[0] > max_rows:
+                raise RowLimitExceededError(max_rows)
+            # 旧的缓存结果没有统计信息，补算一次
+            stats = await run_in_executor("cpu", compute_query_stats, result)
+            stats_changed = True
+        cascader_count = len(stats["cascaders"]) if stats is not None else 0
 
         # 创建data context
+        if result is None and stats is not None:
+            demo_data = '' if stats["rowCount"] == 0 else convert_df_to_csv_string(
+                await run_in_executor("cpu", load_query_result_head, request.uniqueId, 5))
+            row_number = stats["rowCount"]
+        else:
+            demo_data = '' if result is None or (isinstance(
+                result, pd.DataFrame) and result.empty) else convert_df_to_csv_string(result.head(5))
+            row_number = len(result) if result is not None else 0
         data_context = QueryResponseDataContext(
             uniqueId=request.uniqueId,
-            demoData='' if result is None or (isinstance(
-                result, pd.DataFrame) and result.empty) else convert_df_to_csv_string(result.head(5)),
-            rowNumber=len(result) if result is not None else 0,
+            demoData=demo_data,
+            rowNumber=row_number,
         )
 
         # 构造codeContext
         code_context = construct_response_code_context(
             request, request.uniqueId)
-        # 构造cascaderContext
-        cascader_context = construct_response_cascader_context(
-            result, request.cascaderContext.required)
-        # 构造inferredContext
-        inferred_context = construct_response_inferred_context(
-            result, request.inferredContext.required)
+        # 构造cascaderContext与inferredContext，计算量较大，放到cpu执行器中；
+        # 新的查询结果还没有统计信息，只计算请求需要的列，算出的 cascader 组合随统计信息一起保存
+        computed_cascaders = {}
+        cascader_context = await run_in_executor(
+            "cpu", construct_response_cascader_context, result, request.cascaderContext.required, stats,
+            computed_cascaders)
+        inferred_context = await run_in_executor(
+            "cpu", construct_response_inferred_context, result, request.inferredContext.required, stats)
+
+        if result is not None and isinstance(result, pd.DataFrame) and not cache_hit:
+            # 后台持久化并计算统计信息，不阻塞响应
+            await query_result_writer.submit(
+                request.uniqueId, result, [content_key] if content_key is not None else None,
+                cascaders=computed_cascaders)
+        elif cache_hit and stats is not None and (stats_changed or len(stats["cascaders"]) != cascader_count):
+            # 保存新计算的统计信息或 cascader 组合，后续复用时直接使用
+            for key in (request.uniqueId, content_key):
+                await run_in_executor("cpu", save_query_stats, key, stats)
 
         return QueryResponse(
             status="success",
@@ -159,9 +271,22 @@ async def query_by_source_id(request: QueryRequest, username: str = Depends(veri
             codeContext=code_context,
             cascaderContext=cascader_context,
             inferredContext=inferred_context,
-            queryTime=datetime.now().isoformat()
+            queryTime=datetime.now().isoformat(),
+            cacheHit=cache_hit,
+            cacheAge=cache_age
         )
 
+    except SandboxLimitError as e:
+        message = f"[PYTHON] {e}"
+        return QueryResponse(
+            status="error",
+            message=message,
+            codeContext=code_context,
+            error=message,
+            queryTime=datetime.now().isoformat(),
+            alerts=[Alert(type="error", message=message)],
+            limitExceeded=LimitExceeded(limit=e.limit, value=e.value),
+        )
     except Exception as e:
         return QueryResponse(
             status="error",
@@ -172,20 +297,143 @@ async def query_by_source_id(request: QueryRequest, username: str = Depends(veri
             alerts=[Alert(type="error", message=str(e))],
         )
 
-# 同样修改获取查询结果的接口，使用依赖注入进行token验证
-
 
 @router.get("/query_result/{query_hash}")
-async def get_query_result(query_hash: str, session_id: str, username: str = Depends(verify_token_dependency)):
+async def get_query_result(query_hash: str,
+                           session_id: Optional[str] = None,
+                           offset: int = Query(0, ge=0),
+                           limit: int = Query(1000, ge=1, le=MAX_PAGE_ROWS),
+                           columns: Optional[str] = None,
+                           sort_by: Optional[str] = None,
+                           descending: bool = False,
+                           filter: Optional[str] = None,
+                           after: Optional[str] = None,
+                           after_row: Optional[int] = Query(None, ge=0),
+                           format: Literal['json', 'csv', 'arrow'] = 'json',
+                           username: str = Depends(verify_token_dependency)):
+    """
+    分页获取缓存的查询结果，需要验证token
+
+    - columns: 逗号分隔的列名
+    - filter: json对象，列 -> 允许的值列表
+    - after: 配合 sort_by 使用的 keyset 分页
+    - after_row: 上一页最后一行的行号(响应头 X-Last-Row)，排序列有重复值时与 after 一起传入
+    - format: json / csv / arrow(Arrow IPC stream)
+    """
+    try:
+        filters = json.loads(filter) if filter else None
+        if filters is not None and not isinstance(filters, dict):
+            raise ValueError("filter should be a json object")
+        if filters:
+            filters = {column: [str(value) for value in (values if isinstance(values, list) else [values])]
+                       for column, values in filters.items()}
+        await wait_query_result_written(query_hash)
+        page, total_rows, last_row = await run_in_executor(
+            "cpu",
+            read_query_result_page,
+            query_hash,
+            offset=offset,
+            limit=limit,
+            columns=columns.split(",") if columns else None,
+            sort_by=sort_by,
+            descending=descending,
+            filters=filters,
+            after=after,
+            after_row=after_row,
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except TimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except (KeyError, ValueError, pa.ArrowInvalid) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    headers = {"X-Total-Rows": str(total_rows), "X-Offset": str(offset)}
+    if last_row is not None:
+        headers["X-Last-Row"] = str(last_row)
+    if format == 'csv':
+        return StreamingResponse(_stream_csv(page), media_type="text/csv", headers=headers)
+    if format == 'arrow':
+        return StreamingResponse(_stream_arrow(page), media_type="application/vnd.apache.arrow.stream", headers=headers)
+    return StreamingResponse(_stream_json(page), media_type="application/json", headers=headers)
+
+
+def _stream_csv(table: pa.Table, batch_rows: int = 10000):
+    buffer = BytesIO()
+    with pa_csv.CSVWriter(buffer, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=batch_rows):
+            writer.write_batch(batch)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.getvalue():
+        yield buffer.getvalue()
+
+
+def _stream_arrow(table: pa.Table, batch_rows: int = 10000):
+    buffer = BytesIO()
+    with pa_ipc.new_stream(buffer, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=batch_rows):
+            writer.write_batch(batch)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _stream_json(table: pa.Table, batch_rows: int = 10000):
+    yield b"["
+    first = True
+    for batch in table.to_batches(max_chunksize=batch_rows):
+        if batch.num_rows == 0:
+            continue
+        records = batch.to_pandas().to_json(
+            orient='records', date_format='iso', force_ascii=False)
+        yield (("" if first else ",") + records[1:-1]).encode("utf-8")
+        first = False
+    yield b"]"
+
+
+@router.post("/query/cancel/{unique_id}")
+async def cancel_query(unique_id: str, username: str = Depends(verify_token_dependency)):
+    """
+    取消 uniqueId 正在执行的查询，需要验证token
+    """
+    try:
+        return {"cancelled": request_query_cancel(unique_id)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def with_timeout(coro, timeout: Optional[float]):
+    """为单次查询设置超时时间"""
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"[Query] 查询超时(限制 {timeout} 秒)")
+
+
+@router.get("/query_result/{query_hash}/profile")
+async def get_query_result_profile(query_hash: str, username: str = Depends(verify_token_dependency)):
     """
-    根据查询哈希获取缓存的查询结果，需要验证token
+    获取缓存的查询结果的统计信息(每列的 dtype、空值数、不同值个数、最值、高频值等)，需要验证token
     """
-    # 处理查询逻辑
     try:
-        # 这里应该是原来的获取缓存查询结果的逻辑
-        pass
+        await wait_query_result_written(query_hash)
+        stats = await run_in_executor("cpu", get_query_stats, query_hash)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except TimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "uniqueId": query_hash,
+        "rowCount": stats["rowCount"],
+        "columns": stats["columns"],
+    }
 
 
 def convert_df_to_csv_string(df: pd.DataFrame):
@@ -219,50 +467,79 @@ def check_unique_parents(df, columns):
     return True, None
 
 
-def construct_response_inferred_context(df: Optional[pd.DataFrame], inferred_required: List[str]):
-    if df is None or not isinstance(df, pd.DataFrame):
+def stats_cover_contexts(stats: Optional[dict], inferred_required: List[str], cascader_required: List[str]) -> bool:
+    """统计信息是否足以构造全部 inferredContext 与 cascaderContext"""
+    if stats is None:
+        return False
+    if stats["rowCount"] == 0:
+        return True
+    for required_column in inferred_required:
+        _, df_column = required_column.split(".")
+        if get_inferred_values(stats, df_column) is None:
+            return False
+    return all(get_cascader_key(json.loads(cascader_tuple)) in stats["cascaders"]
+               for cascader_tuple in cascader_required)
+
+
+def construct_response_inferred_context(df: Optional[pd.DataFrame], inferred_required: List[str],
+                                        stats: Optional[dict] = None):
+    if stats is None and (df is None or not isinstance(df, pd.DataFrame)):
         raise ValueError("[InferredContext] DataFrame is None")
 
+    # 优先使用统计信息中的不同值，高基数列才需要扫描数据
+    available_columns = stats["columns"] if stats is not None else df.columns
+    empty = stats["rowCount"] == 0 if stats is not None else df.empty
     inferred_context = {}
     for required_column in inferred_required:
         _, df_column = required_column.split(".")
-        if df_column not in df.columns:
+        if df_column not in available_columns:
             raise ValueError(
                 f"[InferredContext] Column {df_column} not found in DataFrame")
 
-        if df.empty:
+        if empty:
             inferred_context[required_column] = []
         else:
-            inferred_context[required_column] = df[df_column].astype(
-                str).unique().tolist()
+            values = get_inferred_values(stats, df_column)
+            if values is None:
+                values = df[df_column].astype(str).unique().tolist()
+            inferred_context[required_column] = values
     return {
         "required": inferred_required,
         "inferred": inferred_context
     }
 
 
-def construct_response_cascader_context(df: Optional[pd.DataFrame], cascader_required: List[str]):
+def construct_response_cascader_context(df: Optional[pd.DataFrame], cascader_required: List[str],
+                                        stats: Optional[dict] = None, computed: Optional[dict] = None):
     # 空数据
-    if df is None or not isinstance(df, pd.DataFrame):
+    if stats is None and (df is None or not isinstance(df, pd.DataFrame)):
         raise ValueError("[CascaderContext] DataFrame is None")
 
     # 检查列是否存在
+    available_columns = stats["columns"] if stats is not None else df.columns
     cascader_tuples = []
     for cascader_tuple in cascader_required:
         columns = json.loads(cascader_tuple)
         for column in columns:
-            if column not in df.columns:
+            if column not in available_columns:
                 raise ValueError(
                     f"[CascaderContext] Column {column} not found in DataFrame")
         cascader_tuples.append(columns)
 
-    # 推断出cascader的值
+    # 推断出cascader的值；组合数不多时记录到统计信息中(没有统计信息时记录到 computed)
     inferred_cascader = {}
-    if df.empty:
+    cached_cascaders = stats["cascaders"] if stats is not None else computed
+    if (stats["rowCount"] == 0 if stats is not None else df.empty):
         for required, columns in zip(cascader_required, cascader_tuples):
             inferred_cascader[required] = ",".join(columns) + "\n"
     else:
         for required, columns in zip(cascader_required, cascader_tuples):
+            # 组合数不多时缓存在统计信息中，复用结果时不再计算
+            key = get_cascader_key(columns)
+            cached = cached_cascaders.get(key) if cached_cascaders is not None else None
+            if cached is not None:
+                inferred_cascader[required] = cached
+                continue
             df_unique = df[columns].drop_duplicates().sort_values(by=columns)
             # flag_unique, df_bad_case = check_unique_parents(df_unique, columns)
             # if not flag_unique:
@@ -270,6 +547,8 @@ def construct_response_cascader_context(df: Optional[pd.DataFrame], cascader_req
             #         f"[CascaderContext] {columns} 存在一个子结点对应多个父结点: {str(df_bad_case)}")
             # 返回csv，是因为前端要基于此，构造cascader树
             inferred_cascader[required] = convert_df_to_csv_string(df_unique)
+            if cached_cascaders is not None and len(df_unique) <= STATS_LOW_CARDINALITY:
+                cached_cascaders[key] = inferred_cascader[required]
     return {
         "required": cascader_required,
         "inferred": inferred_cascader
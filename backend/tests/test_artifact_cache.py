@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from models.artifact_models import ArtifactTextDataContext, PlainParamValue
+from models.query_models import Alert
+from utils import artifact_utils, cache_utils
+
+
+@pytest.fixture
+def artifact_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_utils, "FILE_CACHE_PATH", str(tmp_path))
+    monkeypatch.setattr(cache_utils, "QUERY_CACHE_FORMAT", "arrow")
+    return artifact_utils.ArtifactResultCache(max_bytes=1000)
+
+
+def _key(code="result = df", plain=None, cascader=None, inferred=None):
+    versions = {"df": cache_utils.get_query_result_version("q1")}
+    return artifact_utils.compute_artifact_key(
+        code, "default", versions, plain or {}, cascader or {}, inferred or {})
+
+
+def _result(text: str):
+    return ArtifactTextDataContext(type="text", data=text), "", [Alert(type="info", message="ok")]
+
+
+def test_cache_invalidated_when_query_result_replaced(artifact_cache):
+    cache_utils.save_query_result("q1", pd.DataFrame({"value": [1, 2]}))
+    key = _key()
+    artifact_cache.put(key, _result("first"))
+    assert _key() == key
+    assert artifact_cache.get(key)[0].data == "first"
+
+    # 重新查询后结果文件被替换，缓存键随之变化，不再命中旧结果
+    cache_utils.save_query_result("q1", pd.DataFrame({"value": [3, 4, 5]}))
+    assert _key() != key
+    assert artifact_cache.get(_key()) is None
+
+
+def test_key_depends_on_code_and_params(artifact_cache):
+    cache_utils.save_query_result("q1", pd.DataFrame({"value": [1, 2]}))
+    plain = {"n": PlainParamValue(name="n", type="single", value="1", valueType="int")}
+    keys = {
+        _key(),
+        _key(code="result = df.head(1)"),
+        _key(plain=plain),
+        _key(cascader={"df,region": [["north"]]}),
+        _key(inferred={"df.region": ["north"]}),
+    }
+    assert len(keys) == 5
+
+
+def test_missing_query_result_is_not_cached(artifact_cache):
+    assert _key() is None
+
+
+def test_lru_eviction_within_budget(artifact_cache):
+    for i in range(5):
+        artifact_cache.put(f"k{i}", _result("x" * 300))
+    stats = artifact_cache.stats()
+    assert stats["currentBytes"] <= stats["maxBytes"]
+    assert stats["evictions"] > 0
+    assert artifact_cache.get("k0") is None
+    assert artifact_cache.get("k4") is not None
+    # 单个结果超过预算时不缓存
+    artifact_cache.put("big", _result("x" * 2000))
+    assert artifact_cache.get("big") is None
@@ -0,0 +1,61 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import cache_utils
+
+
+@pytest.fixture
+def gc_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_utils, "FILE_CACHE_PATH", str(tmp_path))
+    monkeypatch.setattr(cache_utils, "QUERY_CACHE_FORMAT", "arrow")
+    return tmp_path
+
+
+def _age(uniqueId: str, seconds: float):
+    """把条目的全部文件的访问和修改时间往前调"""
+    ts = time.time() - seconds
+    for path in cache_utils.find_query_result_path(uniqueId).parent.glob(f"{uniqueId}.*"):
+        os.utime(path, (ts, ts))
+
+
+def test_gc_credits_hardlinked_bytes_once(gc_cache):
+    df = pd.DataFrame({"value": np.arange(10000)})
+    cache_utils.save_query_result("content", df)
+    cache_utils.link_query_result("content", "q1")
+    _age("content", 300)
+    _age("q1", 200)
+
+    occupancy = cache_utils.get_query_cache_occupancy()
+    assert occupancy["entries"] == 2
+    shared_bytes = occupancy["bytes"]
+
+    # 只删除其中一个条目不会释放共享的数据，需要继续删除另一个才能降到上限以下
+    report = cache_utils.collect_query_cache_garbage(
+        max_bytes=shared_bytes - 1, max_age_seconds=3600, protect_seconds=60)
+    assert report["removedEntries"] == 2
+    assert report["reclaimedBytes"] == shared_bytes
+    assert report["remainingBytes"] == 0
+
+
+def test_gc_keeps_shared_inode_until_last_link(gc_cache):
+    df = pd.DataFrame({"value": np.arange(10000)})
+    cache_utils.save_query_result("content", df)
+    cache_utils.link_query_result("content", "q1")
+    _age("content", 7200)
+    # q1 有一个最近写入的附属文件(不与 content 共享)，因此处于最近访问保护期内
+    stats_path = gc_cache / "q1.stats.json"
+    stats_path.write_text("{}")
+    data_bytes = cache_utils.find_query_result_path("q1").stat().st_size
+
+    # 过期的条目被删除，但另一个条目仍在引用同一份数据，没有释放空间
+    report = cache_utils.collect_query_cache_garbage(
+        max_bytes=1 << 40, max_age_seconds=3600, protect_seconds=60)
+    assert report["removedEntries"] == 1
+    assert report["reclaimedBytes"] == 0
+    assert report["remainingEntries"] == 1
+    assert report["remainingBytes"] == data_bytes + 2
+    assert cache_utils.find_query_result_path("q1") is not None
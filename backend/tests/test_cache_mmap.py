@@ -0,0 +1,82 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import cache_utils
+
+
+@pytest.fixture
+def mmap_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_utils, "FILE_CACHE_PATH", str(tmp_path))
+    monkeypatch.setattr(cache_utils, "QUERY_CACHE_MMAP", True)
+    return tmp_path
+
+
+def _mapped_ranges(path) -> list:
+    """/proc/self/maps 中映射了指定文件的地址范围"""
+    ranges = []
+    with open("/proc/self/maps") as f:
+        for line in f:
+            if line.rstrip().endswith(str(path)):
+                start, end = line.split()[0].split("-")
+                ranges.append((int(start, 16), int(end, 16)))
+    return ranges
+
+
+def _points_into(array: np.ndarray, ranges: list) -> bool:
+    address = array.__array_interface__["data"][0]
+    return any(start <= address and address + array.nbytes <= end for start, end in ranges)
+
+
+def _sample_frame() -> pd.DataFrame:
+    n = 1000
+    return pd.DataFrame({
+        "id": np.arange(n, dtype="int64"),
+        "value": np.linspace(0, 1, n),
+        "name": [f"n{i % 7}" for i in range(n)],
+        "score": [None if i % 5 == 0 else float(i) for i in range(n)],
+    })
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="依赖 /proc/self/maps")
+def test_mapped_frame_references_mapping(mmap_cache):
+    cache_utils.save_query_result("q1", _sample_frame())
+    path = cache_utils.find_query_result_path("q1")
+
+    df = cache_utils.load_query_result("q1")
+    ranges = _mapped_ranges(path)
+    assert ranges
+    # 无空值的数值列直接引用映射的页面
+    assert _points_into(df["id"].to_numpy(), ranges)
+    assert _points_into(df["value"].to_numpy(), ranges)
+    # 映射模式下不放入进程内缓存
+    assert not cache_utils.query_result_memory_cache.contains("q1")
+    pd.testing.assert_frame_equal(df, _sample_frame())
+
+
+def test_mapped_frame_is_copy_on_write(mmap_cache):
+    cache_utils.save_query_result("q1", _sample_frame())
+    path = cache_utils.find_query_result_path("q1")
+    content = path.read_bytes()
+
+    df = cache_utils.load_query_result("q1")
+    df.loc[0, "id"] = -1
+    df["value"] *= 2
+
+    assert df.loc[0, "id"] == -1
+    # 修改只影响当前的 DataFrame，不写回缓存文件，也不影响其他读取方
+    assert path.read_bytes() == content
+    pd.testing.assert_frame_equal(cache_utils.load_query_result("q1"), _sample_frame())
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="依赖 /proc/self/maps")
+def test_mapped_column_projection(mmap_cache):
+    cache_utils.save_query_result("q1", _sample_frame())
+    path = cache_utils.find_query_result_path("q1")
+
+    df = cache_utils.load_query_result("q1", ["value", "id"])
+    assert list(df.columns) == ["value", "id"]
+    assert _points_into(df["id"].to_numpy(), _mapped_ranges(path))
+    pd.testing.assert_frame_equal(df, _sample_frame()[["value", "id"]])
@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+from utils import cache_utils
+
+
+@pytest.fixture
+def page_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_utils, "FILE_CACHE_PATH", str(tmp_path))
+    monkeypatch.setattr(cache_utils, "QUERY_CACHE_FORMAT", "arrow")
+    # 排序列有大量重复值
+    df = pd.DataFrame({"group": [i % 3 for i in range(20)], "id": range(20)})
+    cache_utils.save_query_result("q1", df)
+    return df
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_keyset_paging_with_ties_returns_every_row(page_cache, descending):
+    ids = []
+    after = after_row = None
+    while True:
+        page, total_rows, last_row = cache_utils.read_query_result_page(
+            "q1", limit=4, sort_by="group", descending=descending, after=after, after_row=after_row)
+        if page.num_rows == 0:
+            break
+        ids.extend(page["id"].to_pylist())
+        after, after_row = str(page["group"][-1].as_py()), last_row
+
+    expected = page_cache.sort_values("group", ascending=not descending, kind="stable")["id"].tolist()
+    assert ids == expected
+
+
+def test_keyset_paging_without_row_skips_ties(page_cache):
+    page, total_rows, _ = cache_utils.read_query_result_page("q1", sort_by="group", after="0")
+    assert set(page["group"].to_pylist()) == {1, 2}
+    assert total_rows == 13
+
+
+def test_after_row_requires_after(page_cache):
+    with pytest.raises(ValueError):
+        cache_utils.read_query_result_page("q1", sort_by="group", after_row=3)
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pytest
+
+from utils import cache_utils
+
+
+@pytest.fixture(params=["arrow", "parquet"])
+def cache_format(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_utils, "FILE_CACHE_PATH", str(tmp_path))
+    monkeypatch.setattr(cache_utils, "QUERY_CACHE_FORMAT", request.param)
+    monkeypatch.setattr(cache_utils, "QUERY_CACHE_BATCH_ROWS", 100)
+    return request.param
+
+
+def _sample_frame() -> pd.DataFrame:
+    n = 1000
+    # region=north 的行在各个可空列中都没有空值，其余的行有
+    north = np.arange(n) % 4 == 0
+    return pd.DataFrame({
+        "region": np.where(north, "north", "south"),
+        "count": pd.array([i if north[i] or i % 3 else None for i in range(n)], dtype="Int64"),
+        "flag": pd.array([bool(i % 2) if north[i] or i % 3 else None for i in range(n)], dtype="boolean"),
+        "legacy": [i if north[i] or i % 3 else None for i in range(n)],
+        "plain": np.arange(n),
+    })
+
+
+def _save(uniqueId: str, df: pd.DataFrame):
+    cache_utils.save_query_result(uniqueId, df)
+    # 整个结果在进程内缓存时不做下推
+    cache_utils.query_result_memory_cache.pop(uniqueId)
+
+
+def test_pushdown_keeps_full_load_dtypes(cache_format):
+    _save("q1", _sample_frame())
+
+    filtered = cache_utils.load_query_result_filtered("q1", [("region", ["north"], False)])
+    full = cache_utils.load_query_result("q1")
+    expected = full[full["region"] == "north"]
+
+    assert filtered is not None
+    assert filtered["count"].dtype == "Int64"
+    assert filtered["flag"].dtype == "boolean"
+    pd.testing.assert_frame_equal(filtered, expected)
+
+
+def test_pushdown_skips_files_without_null_metadata(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_utils, "FILE_CACHE_PATH", str(tmp_path))
+    monkeypatch.setattr(cache_utils, "QUERY_CACHE_FORMAT", "arrow")
+    df = _sample_frame()
+    _save("q1", df)
+    # 模拟旧版本写入的缓存文件(schema 中没有记录含空值的列)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    path = cache_utils.find_query_result_path("q1")
+    with pa.OSFile(str(path), "wb") as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=100)
+
+    assert cache_utils.load_query_result_filtered("q1", [("region", ["north"], False)]) is None
@@ -0,0 +1,58 @@
+import linecache
+
+import pytest
+
+from utils import code_utils
+
+
+@pytest.fixture
+def cache():
+    return code_utils.CompiledCodeCache(max_entries=2)
+
+
+def test_same_code_compiled_once(cache):
+    first = cache.compile("result = 1", "python")
+    assert cache.compile("result = 1", "python") is first
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    # 不同类型的代码使用不同的文件名
+    assert cache.compile("result = 1", "artifact") is not first
+
+
+def test_syntax_error_is_cached_and_raised_fresh(cache):
+    code = "result = (1,\n"
+    with pytest.raises(SyntaxError) as first:
+        cache.compile(code, "python")
+    with pytest.raises(SyntaxError) as second:
+        cache.compile(code, "python")
+    assert cache.stats() == {"entries": 1, "maxEntries": 2, "hits": 1, "misses": 1}
+    # 每次抛出新的异常对象，位置信息保持不变
+    assert first.value is not second.value
+    assert second.value.__traceback__ is not first.value.__traceback__
+    assert (second.value.msg, second.value.lineno) == (first.value.msg, first.value.lineno)
+    assert second.value.filename.startswith("<python-")
+
+
+def test_null_bytes_are_reported_as_syntax_error(cache):
+    with pytest.raises(SyntaxError):
+        cache.compile("result = 1\0", "python")
+
+
+def test_lru_eviction_releases_linecache(cache):
+    codes = [f"result = {i}" for i in range(3)]
+    objects = [cache.compile(code, "python") for code in codes]
+    filenames = [code.co_filename for code in objects]
+    assert filenames[0] not in cache
+    assert filenames[0] not in linecache.cache
+    assert all(filename in cache and filename in linecache.cache for filename in filenames[1:])
+
+
+def test_user_traceback_shows_user_lines():
+    code = "x = 1\nraise ValueError('boom')\n"
+    try:
+        exec(code_utils.compile_user_code(code, "artifact"), {})
+    except ValueError as e:
+        text = code_utils.format_user_traceback(e)
+    assert "raise ValueError('boom')" in text
+    assert text.rstrip().endswith("ValueError: boom")
+    assert __file__ not in text
@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+import pandas as pd
+import pytest
+
+from models.engine_models import EngineConfig
+from utils import engine_utils
+
+
+class SlowEngine(engine_utils.SQLEngine):
+    """执行时等待 release，记录是否已关闭"""
+
+    def __init__(self, config: EngineConfig):
+        super().__init__(config)
+        self.release = asyncio.Event()
+        self.closed = False
+
+    async def execute(self, query, max_rows=None, views=None):
+        await self.release.wait()
+        return pd.DataFrame({"q": [query]})
+
+    async def _close(self):
+        self.closed = True
+
+
+def test_sql_engine_is_abstract():
+    with pytest.raises(TypeError):
+        engine_utils.SQLEngine(EngineConfig(name="x", driver="duckdb", dsn=":memory:"))
+
+
+def test_missing_default_engine_fails_loudly(tmp_path):
+    config_file = str(tmp_path / "engines.json")
+    registry = engine_utils.EngineRegistry(config_file, engine_utils.default_engine_configs([]))
+    assert "results" in registry
+    with pytest.raises(ValueError, match="engines.json"):
+        registry["default"]
+
+
+def test_legacy_engine_config_module(tmp_path, monkeypatch):
+    (tmp_path / "legacy_engine_config.py").write_text(
+        "import pandas as pd\n"
+        "async def execute_query(query, url=None):\n"
+        "    return pd.DataFrame({'q': [query] * 3})\n"
+        "sql_engine = {'default': execute_query}\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    configs, engines = engine_utils.load_engine_overrides("legacy_engine_config")
+    registry = engine_utils.EngineRegistry(
+        str(tmp_path / "engines.json"), engine_utils.default_engine_configs(configs), engines)
+
+    async def run():
+        assert len(await registry["default"]("select 1")) == 3
+        with pytest.raises(engine_utils.RowLimitExceededError):
+            await registry["default"]("select 1", 2)
+        await registry.close()
+    asyncio.run(run())
+    assert engine_utils.load_engine_overrides("missing_engine_config") == ([], {})
+
+
+def test_close_waits_for_retired_engines(tmp_path, monkeypatch):
+    monkeypatch.setitem(engine_utils.ENGINE_DRIVERS, "duckdb", SlowEngine)
+    config_file = tmp_path / "engines.json"
+
+    def write_config(timeout):
+        config_file.write_text(json.dumps({"engines": [
+            {"name": "default", "driver": "duckdb", "dsn": ":memory:", "timeout": timeout}]}))
+
+    async def run():
+        write_config(10)
+        registry = engine_utils.EngineRegistry(str(config_file), [])
+        old = registry["default"]
+        query = asyncio.create_task(old("select 1"))
+        await asyncio.sleep(0)
+        # 修改配置后旧引擎被替换，等其查询结束后关闭
+        write_config(20)
+        registry.reload()
+        assert registry["default"] is not old
+        closing = asyncio.create_task(registry.close())
+        await asyncio.sleep(0.2)
+        assert not old.closed and not closing.done()
+        old.release.set()
+        await query
+        await closing
+        assert old.closed
+    asyncio.run(run())
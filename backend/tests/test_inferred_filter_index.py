@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import artifact_utils, cache_utils
+
+
+@pytest.fixture
+def index_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_utils, "FILE_CACHE_PATH", str(tmp_path))
+    monkeypatch.setattr(cache_utils, "QUERY_CACHE_FORMAT", "arrow")
+    cache = cache_utils.FilterIndexCache(max_bytes=1 << 20)
+    monkeypatch.setattr(artifact_utils, "filter_index_cache", cache)
+    return cache
+
+
+def _frame(n: int = 1000) -> pd.DataFrame:
+    return pd.DataFrame({
+        "region": np.where(np.arange(n) % 2 == 0, "north", "south"),
+        "name": [None if i % 5 == 0 else ("Foo" if i % 3 else "bar") for i in range(n)],
+        "value": np.arange(n),
+    })
+
+
+def _expected(df: pd.DataFrame, column: str, values) -> pd.DataFrame:
+    return df[df[column].fillna('').astype(str).str.lower().isin(values)]
+
+
+def test_index_normalizes_values():
+    codes, mapping = artifact_utils.build_inferred_filter_index(pd.Series(["Foo", None, "FOO", 1]))
+    assert set(mapping) == {"foo", "", "1"}
+    assert codes.dtype == np.int32
+    assert codes[0] == codes[2] == mapping["foo"]
+
+
+@pytest.mark.parametrize("values", [["foo"], ["", "bar"], ["missing"], "foo"])
+def test_inferred_filter_matches_pandas(values):
+    df = _frame()
+    filtered = artifact_utils.filter_artifact_dataframes({"df": df}, {}, {"df.name": values})["df"]
+    expected = _expected(df, "name", [values] if isinstance(values, str) else values)
+    pd.testing.assert_frame_equal(filtered, expected)
+
+
+def test_inferred_filter_after_cascader():
+    df = _frame()
+    filtered = artifact_utils.filter_artifact_dataframes(
+        {"df": df}, {"df,region": [["north"]]}, {"df.name": ["foo"]})["df"]
+    expected = _expected(df[df["region"] == "north"], "name", ["foo"])
+    pd.testing.assert_frame_equal(filtered, expected)
+
+
+def test_index_reused_until_result_replaced(index_cache):
+    df = _frame()
+    cache_utils.save_query_result("q1", df)
+    for _ in range(2):
+        artifact_utils.filter_artifact_dataframes({"df": df}, {}, {"df.name": ["foo"]}, {"df": "q1"})
+    assert index_cache.stats()["hits"] == 1
+    assert index_cache.stats()["misses"] == 1
+
+    # 结果被替换后索引失效，按新的结果重新构造
+    replaced = _frame(10)
+    cache_utils.save_query_result("q1", replaced)
+    filtered = artifact_utils.filter_artifact_dataframes(
+        {"df": replaced}, {}, {"df.name": ["foo"]}, {"df": "q1"})["df"]
+    pd.testing.assert_frame_equal(filtered, _expected(replaced, "name", ["foo"]))
+    assert index_cache.stats()["misses"] == 2
+    assert index_cache.stats()["entries"] == 1
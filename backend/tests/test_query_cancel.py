@@ -0,0 +1,105 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+
+from utils import cache_utils, query_utils
+
+
+@pytest.fixture
+def marker_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(query_utils, "FILE_CACHE_PATH", str(tmp_path))
+    monkeypatch.setattr(cache_utils, "FILE_CACHE_PATH", str(tmp_path))
+    monkeypatch.setattr(query_utils, "QUERY_CANCEL_POLL_INTERVAL", 0.01)
+    return tmp_path
+
+
+def _other_process_marker(marker_cache, uniqueId: str, content: str, pid: int = None):
+    """模拟其他 worker 进程正在执行的查询"""
+    marker_dir = marker_cache / "running"
+    marker_dir.mkdir(exist_ok=True)
+    marker = marker_dir / f"{uniqueId}.{pid or os.getppid()}"
+    marker.write_text(content)
+    return marker
+
+
+async def _run_until_cancelled(uniqueId: str, content_key: str, on_start):
+    async def query():
+        await asyncio.sleep(10)
+
+    async def trigger():
+        await asyncio.sleep(0.05)
+        on_start()
+    asyncio.ensure_future(trigger())
+    with pytest.raises(query_utils.QueryCancelledError) as e:
+        await query_utils.run_cancellable(uniqueId, content_key, None, query())
+    return str(e.value)
+
+
+def test_cancel_without_running_query_is_noop(marker_cache):
+    assert query_utils.request_query_cancel("q1") == 0
+    assert not (marker_cache / "running").exists()
+    assert list(marker_cache.iterdir()) == []
+
+
+def test_markers_stay_out_of_results_directory(marker_cache):
+    async def run():
+        async def query():
+            assert (marker_cache / "running" / f"q1.{os.getpid()}").read_text() == "cas_a"
+            return 1
+        return await query_utils.run_cancellable("q1", "cas_a", None, query())
+    assert asyncio.run(run()) == 1
+    assert [path.name for path in marker_cache.iterdir()] == ["running"]
+    assert list((marker_cache / "running").iterdir()) == []
+
+
+def test_cancel_from_other_process(marker_cache):
+    # 另一个进程也在执行同一查询(内容相同，不互相取消)
+    other = _other_process_marker(marker_cache, "q1", "cas_a")
+
+    def cancel_in_other_process():
+        # 取消请求由另一个进程处理: 本进程的查询不在其 _running_requests 中
+        local = query_utils._running_requests.pop("q1")
+        try:
+            assert query_utils.request_query_cancel("q1") == 0
+        finally:
+            query_utils._running_requests["q1"] = local
+    message = asyncio.run(_run_until_cancelled("q1", "cas_a", cancel_in_other_process))
+    assert message == "[Query] 查询已取消"
+    # 另一个进程仍在执行，取消标记由最后结束的进程删除
+    assert (marker_cache / "running" / "q1.cancel").exists()
+    other.unlink()
+
+
+def test_newer_query_in_other_process_supersedes(marker_cache):
+    message = asyncio.run(_run_until_cancelled(
+        "q1", "cas_a", lambda: _other_process_marker(marker_cache, "q1", "cas_b")))
+    assert message == "[Query] 已有新的查询，当前查询已取消"
+
+
+def test_same_query_in_other_process_keeps_running(marker_cache):
+    async def run():
+        async def query():
+            await asyncio.sleep(0.05)
+            _other_process_marker(marker_cache, "q1", "cas_a")
+            await asyncio.sleep(0.05)
+            return 1
+        return await query_utils.run_cancellable("q1", "cas_a", None, query())
+    assert asyncio.run(run()) == 1
+
+
+def test_gc_removes_stale_markers(marker_cache):
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    stale = _other_process_marker(marker_cache, "q1", "cas_a", pid=dead.pid)
+    alive = _other_process_marker(marker_cache, "q2", "cas_b")
+    cancel = marker_cache / "running" / "q3.cancel"
+    cancel.write_text("")
+    os.utime(cancel, (0, 0))
+
+    cache_utils.collect_query_cache_garbage(max_bytes=1 << 40, max_age_seconds=3600, protect_seconds=60)
+    assert not stale.exists()
+    assert not cancel.exists()
+    assert alive.exists()
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+
+import pandas as pd
+import pytest
+
+from utils import cache_utils
+
+
+@pytest.fixture
+def writer(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_utils, "FILE_CACHE_PATH", str(tmp_path))
+    monkeypatch.setattr(cache_utils, "QUERY_CACHE_FORMAT", "arrow")
+    writer = cache_utils.QueryResultWriter(max_workers=2, max_pending=2)
+    # wait_query_result_written 使用全局的写入队列
+    monkeypatch.setattr(cache_utils, "query_result_writer", writer)
+    yield writer
+    writer.shutdown()
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    """写入 value 列第一个值为负数的结果时阻塞，直到 gate 被设置"""
+    event = threading.Event()
+    compute_query_stats = cache_utils.compute_query_stats
+
+    def blocking_stats(df):
+        if df["value"].iloc[0] < 0:
+            assert event.wait(10)
+        return compute_query_stats(df)
+    monkeypatch.setattr(cache_utils, "compute_query_stats", blocking_stats)
+    return event
+
+
+def _frame(first: int) -> pd.DataFrame:
+    return pd.DataFrame({"value": [first, 1, 2]})
+
+
+def test_writes_for_same_unique_id_keep_order(writer, gate):
+    async def run():
+        await writer.submit("q1", _frame(-1))
+        second = asyncio.ensure_future(writer.submit("q1", _frame(100)))
+        await asyncio.sleep(0.1)
+        # 后提交的写入等待前一次写入完成，不会被旧结果覆盖
+        assert not second.done()
+        gate.set()
+        await second
+        await cache_utils.wait_query_result_written("q1")
+    asyncio.run(run())
+    cache_utils.query_result_memory_cache.pop("q1")
+    assert cache_utils.load_query_result("q1")["value"].iloc[0] == 100
+    assert writer.stats()["written"] == 2
+
+
+def test_pending_markers_cover_link_targets(writer, gate, tmp_path):
+    async def run():
+        await writer.submit("q1", _frame(-1), link_to=["cas_1"])
+        # 写入完成前，结果与链接目标都标记为写入中，其他进程据此等待
+        assert (tmp_path / "q1.pending").exists()
+        assert (tmp_path / "cas_1.pending").exists()
+        assert writer.get_pending("cas_1") is writer.get_pending("q1")
+        gate.set()
+        await cache_utils.wait_query_result_written("cas_1")
+    asyncio.run(run())
+    assert not (tmp_path / "q1.pending").exists()
+    assert not (tmp_path / "cas_1.pending").exists()
+    assert cache_utils.find_query_result_path("cas_1") is not None
+    assert writer.stats()["pending"] == 0
+
+
+def test_submit_waits_when_queue_is_full(writer, gate):
+    async def run():
+        await writer.submit("q1", _frame(-1))
+        await writer.submit("q2", _frame(-2))
+        assert writer.stats()["pending"] == 2
+        # 排队的写入达到上限，提交方等待最早的写入完成
+        third = asyncio.ensure_future(writer.submit("q3", _frame(3)))
+        await asyncio.sleep(0.1)
+        assert not third.done()
+        gate.set()
+        await third
+        for uniqueId in ("q1", "q2", "q3"):
+            await cache_utils.wait_query_result_written(uniqueId)
+    asyncio.run(run())
+    assert writer.stats()["written"] == 3
+
+
+def test_failed_write_removes_stale_result(writer, monkeypatch):
+    async def run():
+        await writer.submit("q1", _frame(1))
+        await cache_utils.wait_query_result_written("q1")
+
+        def failing_save(*args, **kwargs):
+            raise OSError("disk full")
+        monkeypatch.setattr(cache_utils, "save_query_result", failing_save)
+        await writer.submit("q1", _frame(2))
+        with pytest.raises(ValueError):
+            await cache_utils.wait_query_result_written("q1")
+    asyncio.run(run())
+    # 不保留同一 uniqueId 的旧结果
+    assert cache_utils.find_query_result_path("q1") is None
+    assert writer.stats()["failed"] == 1
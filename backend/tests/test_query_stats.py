@@ -0,0 +1,61 @@
+import json
+
+import pandas as pd
+import pytest
+
+from utils import cache_utils
+
+
+@pytest.fixture
+def stats_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_utils, "FILE_CACHE_PATH", str(tmp_path))
+    monkeypatch.setattr(cache_utils, "QUERY_CACHE_FORMAT", "arrow")
+    return tmp_path
+
+
+def _frame(n: int) -> pd.DataFrame:
+    return pd.DataFrame({"region": ["north", "south"] * n, "value": range(2 * n)})
+
+
+def test_stats_saved_with_result_version(stats_cache):
+    df = _frame(5)
+    cache_utils.save_query_result("q1", df, cache_utils.compute_query_stats(df))
+
+    stats = cache_utils.load_query_stats("q1")
+    assert stats["rowCount"] == 10
+    assert stats["columns"]["region"]["distinct"] == 2
+    saved = json.loads((stats_cache / "q1.stats.json").read_text())
+    assert saved["version"] == list(cache_utils.get_query_result_version("q1"))
+
+
+def test_stats_invalidated_when_result_replaced(stats_cache):
+    df = _frame(5)
+    cache_utils.save_query_result("q1", df, cache_utils.compute_query_stats(df))
+    stats_file = (stats_cache / "q1.stats.json").read_text()
+
+    # 结果文件被替换(如其他进程重新写入)，旧的统计信息不再匹配
+    cache_utils.save_query_result("q1", _frame(20))
+    (stats_cache / "q1.stats.json").write_text(stats_file)
+    assert cache_utils.load_query_stats("q1") is None
+
+    # 按需重新计算并保存
+    assert cache_utils.get_query_stats("q1")["rowCount"] == 40
+    assert cache_utils.load_query_stats("q1")["rowCount"] == 40
+
+
+def test_stats_follow_linked_result(stats_cache):
+    df = _frame(5)
+    cache_utils.save_query_result("cas_1", df, cache_utils.compute_query_stats(df))
+    cache_utils.link_query_result("cas_1", "q1")
+    # 硬链接共享 inode 与 mtime，统计信息随结果一起复用
+    assert cache_utils.load_query_stats("q1") == cache_utils.load_query_stats("cas_1")
+
+
+def test_missing_or_corrupt_stats(stats_cache):
+    assert cache_utils.load_query_stats("q1") is None
+    cache_utils.save_query_result("q1", _frame(5))
+    assert cache_utils.load_query_stats("q1") is None
+    (stats_cache / "q1.stats.json").write_text("{not json")
+    assert cache_utils.load_query_stats("q1") is None
+    with pytest.raises(FileNotFoundError):
+        cache_utils.save_query_stats("missing", {"rowCount": 0})
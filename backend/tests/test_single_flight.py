@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from utils import query_utils
+
+
+def _counting_query(calls: list, release: asyncio.Event, result="ok"):
+    async def query():
+        calls.append(1)
+        try:
+            await release.wait()
+        except asyncio.CancelledError:
+            calls.append("cancelled")
+            raise
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return query
+
+
+def test_concurrent_waiters_share_one_execution():
+    async def run():
+        calls, release = [], asyncio.Event()
+        waiters = [asyncio.ensure_future(query_utils.run_single_flight("k", _counting_query(calls, release)))
+                   for _ in range(3)]
+        await asyncio.sleep(0)
+        task = query_utils._inflight_queries["k"]
+        assert query_utils._inflight_waiters[task] == 3
+        release.set()
+        assert await asyncio.gather(*waiters) == ["ok"] * 3
+        assert calls == [1]
+        # 执行结束后清理状态
+        assert "k" not in query_utils._inflight_queries
+        assert task not in query_utils._inflight_waiters
+    asyncio.run(run())
+
+
+def test_waiters_share_the_same_error():
+    async def run():
+        calls, release = [], asyncio.Event()
+        error = ValueError("boom")
+        waiters = [asyncio.ensure_future(query_utils.run_single_flight("k", _counting_query(calls, release, error)))
+                   for _ in range(2)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert results == [error, error]
+        assert calls == [1]
+    asyncio.run(run())
+
+
+def test_cancel_keeps_execution_while_other_waiters_remain():
+    async def run():
+        calls, release = [], asyncio.Event()
+        first = asyncio.ensure_future(query_utils.run_single_flight("k", _counting_query(calls, release)))
+        second = asyncio.ensure_future(query_utils.run_single_flight("k", _counting_query(calls, release)))
+        await asyncio.sleep(0)
+        task = query_utils._inflight_queries["k"]
+
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert not task.cancelled()
+        assert query_utils._inflight_waiters[task] == 1
+
+        release.set()
+        assert await second == "ok"
+        assert "cancelled" not in calls
+    asyncio.run(run())
+
+
+def test_last_waiter_leaving_cancels_execution():
+    async def run():
+        calls, release = [], asyncio.Event()
+        waiters = [asyncio.ensure_future(query_utils.run_single_flight("k", _counting_query(calls, release)))
+                   for _ in range(2)]
+        await asyncio.sleep(0)
+        task = query_utils._inflight_queries["k"]
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert task.cancelled()
+        assert calls == [1, "cancelled"]
+        assert "k" not in query_utils._inflight_queries
+        assert task not in query_utils._inflight_waiters
+
+        # 之后的请求重新执行
+        release.set()
+        assert await query_utils.run_single_flight("k", _counting_query(calls, release)) == "ok"
+    asyncio.run(run())
@@ -0,0 +1,584 @@
+import io
+import os
+import sys
+import json
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Literal, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from models.artifact_models import (ArtifactDataContext, ArtifactTextDataContext, ArtifactPlotlyDataContext,
+                                    ArtifactEChartDataContext, ArtifactImageDataContext, ArtifactAltairDataContext,
+                                    ArtifactTableDataContext, ArtifactPerspectiveDataContext, PlainParamValue)
+from models.query_models import Alert
+from utils.cache_utils import load_query_result, load_query_result_filtered, get_query_result_version, filter_index_cache
+from utils.code_utils import compile_user_code, format_user_traceback
+from utils.sandbox_utils import SandboxLimitError
+
+# artifact 代码的默认超时时间(秒)
+ARTIFACT_TIMEOUT = float(os.environ.get("DATAVIZ_ARTIFACT_TIMEOUT", 120))
+# 进程内 artifact 执行结果缓存的内存上限(字节)，0 表示不缓存
+ARTIFACT_CACHE_MAX_BYTES = int(os.environ.get(
+    "DATAVIZ_ARTIFACT_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+
+ArtifactResult = Tuple[Optional[ArtifactDataContext], str, List[Alert]]
+
+
+class DataSourceLoadError(Exception):
+    """artifact 依赖的数据源加载失败"""
+
+    def __init__(self, alias: str, error: str):
+        super().__init__(error)
+        self.alias = alias
+        self.error = error
+
+    def __reduce__(self):
+        return (DataSourceLoadError, (self.alias, self.error))
+
+
+class ArtifactCodeError(Exception):
+    """用户代码执行出错，保留出错前捕获的输出；只记录错误类型的名称，以便从沙箱进程返回"""
+
+    def __init__(self, error_type: str, error: str, output: str):
+        super().__init__(error)
+        self.error_type = error_type
+        self.error = error
+        self.output = output
+
+    def __reduce__(self):
+        return (ArtifactCodeError, (self.error_type, self.error, self.output))
+
+
+class _ThreadLocalStdout:
+    """
+    替换 sys.stdout: 正在捕获输出的线程写入自己的缓冲区，其余线程写入原来的 stdout；
+    redirect_stdout 修改的是进程全局的 sys.stdout，并发执行时会互相串台
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def _target(self):
+        return getattr(self._local, "buffer", None) or self._stream
+
+    def write(self, text: str) -> int:
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+    def __getattr__(self, name: str):
+        return getattr(self._stream, name)
+
+
+_stdout_proxy: Optional[_ThreadLocalStdout] = None
+_stdout_proxy_lock = threading.Lock()
+
+
+@contextmanager
+def capture_stdout():
+    """
+    捕获当前线程的标准输出
+
+    Yields:
+        io.StringIO: 捕获到的输出
+    """
+    global _stdout_proxy
+    with _stdout_proxy_lock:
+        if _stdout_proxy is None or sys.stdout is not _stdout_proxy:
+            _stdout_proxy = _ThreadLocalStdout(sys.stdout)
+            sys.stdout = _stdout_proxy
+    proxy = _stdout_proxy
+    buffer = io.StringIO()
+    previous = getattr(proxy._local, "buffer", None)
+    proxy._local.buffer = buffer
+    try:
+        yield buffer
+    finally:
+        proxy._local.buffer = previous
+
+
+def compute_artifact_key(code: str,
+                         engine: str,
+                         input_versions: Dict[str, Optional[tuple]],
+                         plain_param_values: Dict[str, PlainParamValue],
+                         cascader_param_values: Dict[str, List[List[str]]],
+                         inferred_param_values: Dict[str, Any]) -> Optional[str]:
+    """
+    根据代码、依赖的查询结果版本与参数值计算 artifact 结果的缓存键
+
+    Args:
+        input_versions (Dict[str, Optional[tuple]]): 数据源别名 -> 查询结果版本，结果被替换后键随之变化
+
+    Returns:
+        Optional[str]: 缓存键；某个查询结果不存在时返回 None(不缓存)
+    """
+    if any(version is None for version in input_versions.values()):
+        return None
+    parts = {
+        "code": code,
+        "engine": engine,
+        "inputs": input_versions,
+        "plain": {name: value.dict() if isinstance(value, PlainParamValue) else value
+                  for name, value in plain_param_values.items()},
+        "cascader": cascader_param_values,
+        "inferred": inferred_param_values,
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class ArtifactResultCache:
+    """
+    按缓存键保存 artifact 的执行结果(数据上下文、捕获的输出、提示信息)，
+    超出内存预算时淘汰最久未使用的条目
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[ArtifactResult, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _size(result: ArtifactResult) -> int:
+        data_context, output, alerts = result
+        size = len(output) + sum(len(alert.message) for alert in alerts)
+        if data_context is not None:
+            size += sum(len(value) for value in data_context.dict().values()
+                        if isinstance(value, str))
+        return size
+
+    def get(self, key: str) -> Optional[ArtifactResult]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, result: ArtifactResult):
+        size = self._size(result)
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            # 单个结果超过预算时不缓存
+            if self.max_bytes <= 0 or size > self.max_bytes:
+                return
+            self._entries[key] = (result, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "currentBytes": self.current_bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# 进程内的 artifact 执行结果缓存
+artifact_result_cache = ArtifactResultCache(ARTIFACT_CACHE_MAX_BYTES)
+
+
+def convert_plain_param_value(value: str, valueType: Literal['string', 'double', 'boolean', 'int']) -> Any:
+    try:
+        """转换普通参数值"""
+        if valueType == 'string':
+            return str(value)
+        elif valueType == 'double':
+            return float(value)
+        elif valueType == 'boolean':
+            return bool(value)
+        elif valueType == 'int':
+            return int(value)
+    except Exception as e:
+        raise ValueError(
+            f"[PARAMS] Invalid plain param value: {value}, should be a {valueType}, with error: {str(e)}")
+
+
+def select_cascader_rows(df: pd.DataFrame, columns: List[str], paths: List[List[str]]) -> np.ndarray:
+    """
+    计算 cascader 选中的行位置: 每层列只转换为字符串并编码一次，
+    所有路径(前缀)在编码后的整数键上一次匹配
+
+    结果与逐条路径过滤后 concat 的顺序一致: 按路径顺序，路径内按原始行顺序，
+    多条路径重复选中的行会重复出现
+
+    Args:
+        df (pd.DataFrame): 数据源
+        columns (List[str]): cascader 各层对应的列
+        paths (List[List[str]]): 选中的路径，长度可以小于层数(选中整个分支)
+
+    Returns:
+        np.ndarray: 行位置，可直接用于 iloc
+    """
+    depths = np.array([min(len(path), len(columns))
+                      for path in paths], dtype=np.int64)
+    max_depth = int(depths.max()) if len(paths) else 0
+    row_keys = np.zeros(len(df), dtype=np.int64)
+    path_keys = np.zeros(len(paths), dtype=np.int64)
+    # level_row_keys[k]: 每行前 k 层组合的编码；level_row_keys[0] 对应不限制的空路径
+    level_row_keys = [row_keys]
+    for level in range(max_depth):
+        # 与原来的 astype(str) == value 比较方式保持一致
+        codes, uniques = pd.factorize(df[columns[level]].astype(str))
+        active = depths > level
+        values = [path[level] if depth > level else "" for path,
+                  depth in zip(paths, depths)]
+        path_codes = pd.Index(uniques).get_indexer(values)
+        # 前 level 层的组合编码与本层编码合并后重新编码，整数键不会溢出
+        row_keys, combined = pd.factorize(row_keys * len(uniques) + codes)
+        matched = active & (path_keys >= 0) & (path_codes >= 0)
+        next_path_keys = np.full(len(paths), -1, dtype=np.int64)
+        next_path_keys[matched] = pd.Index(combined).get_indexer(
+            path_keys[matched] * len(uniques) + path_codes[matched])
+        path_keys = np.where(active, next_path_keys, path_keys)
+        level_row_keys.append(row_keys.astype(np.int64))
+
+    # 按 (深度, 键) 分组的行位置，稳定排序保证组内为原始行顺序
+    groups = {}
+    positions = []
+    for depth, key in zip(depths, path_keys):
+        if key < 0:
+            continue
+        if depth not in groups:
+            keys = level_row_keys[depth]
+            order = np.argsort(keys, kind="stable")
+            counts = np.bincount(keys, minlength=1)
+            groups[depth] = (order, np.concatenate(([0], np.cumsum(counts))))
+        order, offsets = groups[depth]
+        positions.append(order[offsets[key]:offsets[key + 1]])
+    if not positions:
+        return np.array([], dtype=np.int64)
+    return np.concatenate(positions)
+
+
+def build_inferred_filter_index(series: pd.Series) -> Tuple[np.ndarray, Dict[str, int]]:
+    """
+    构造 inferred 参数过滤用的归一化索引: 列值 fillna('') 后转为小写字符串并编码
+
+    Returns:
+        Tuple[np.ndarray, Dict[str, int]]: 每行的编码, 小写字符串 -> 编码
+    """
+    codes, uniques = pd.factorize(series.fillna('').astype(str).str.lower())
+    if len(uniques) < np.iinfo(np.int32).max:
+        codes = codes.astype(np.int32)
+    return codes, {value: code for code, value in enumerate(uniques)}
+
+
+def get_inferred_filter_index(df: pd.DataFrame, column: str, uniqueId: Optional[str] = None) -> Tuple[np.ndarray, Dict[str, int]]:
+    """
+    获取某列的 inferred 过滤索引，同一查询结果的同一列只构造一次
+
+    Args:
+        df (pd.DataFrame): 完整的查询结果
+        column (str): 列名
+        uniqueId (Optional[str]): 查询结果ID，None 时不缓存
+    """
+    if uniqueId is None:
+        return build_inferred_filter_index(df[column])
+    version = get_query_result_version(uniqueId)
+    index = filter_index_cache.get(uniqueId, column, version)
+    # 行数不一致说明结果恰好在加载后被替换
+    if index is None or len(index[0]) != len(df):
+        index = build_inferred_filter_index(df[column])
+        filter_index_cache.put(uniqueId, column, index, version)
+    return index
+
+
+def filter_artifact_dataframes(dfs: Dict[str, pd.DataFrame],
+                               cascader_param_values: Dict[str, List[List[str]]],
+                               inferred_param_values: Dict[str, Any],
+                               dfAliasUniqueIds: Optional[Dict[str, str]] = None) -> Dict[str, pd.DataFrame]:
+    """
+    按 cascader 与 inferred 参数过滤数据源；过滤过程只记录选中的行位置，最后每个数据源只做一次 iloc
+
+    Args:
+        dfs (Dict[str, pd.DataFrame]): 数据源别名 -> 完整的查询结果
+        cascader_param_values (Dict[str, List[List[str]]]): "别名,列1,列2..." -> 选中的路径
+        inferred_param_values (Dict[str, Any]): "别名.列" -> 选中的值(小写)
+        dfAliasUniqueIds (Optional[Dict[str, str]]): 加载了完整结果的数据源别名 -> 查询结果ID，用于复用 inferred 过滤索引
+
+    Returns:
+        Dict[str, pd.DataFrame]: 过滤后的数据源
+    """
+    dfAliasUniqueIds = dfAliasUniqueIds or {}
+    positions: Dict[str, np.ndarray] = {}
+    for param_name, param_values in cascader_param_values.items():
+        df_alias, df_columns = param_name.split(
+            ",")[0], param_name.split(",")[1:]
+
+        # 对于cascader_params, 如果参数值为空, 则默认为全选
+        if len(param_values) == 0 or len(param_values[0]) == 0:
+            continue
+
+        df = dfs[df_alias]
+        selected = positions.get(df_alias)
+        rows = select_cascader_rows(
+            df if selected is None else df.iloc[selected], df_columns, param_values)
+        positions[df_alias] = rows if selected is None else selected[rows]
+
+    for param_name, param_value in inferred_param_values.items():
+        df_alias, df_column = param_name.split('.')[:2]
+        codes, mapping = get_inferred_filter_index(
+            dfs[df_alias], df_column, dfAliasUniqueIds.get(df_alias))
+        values = [param_value] if isinstance(
+            param_value, str) else param_value
+        # 过滤变为编码上的整数 isin
+        wanted = np.array(sorted({mapping[value] for value in values if value in mapping}),
+                          dtype=codes.dtype)
+        selected = positions.get(df_alias)
+        if selected is None:
+            positions[df_alias] = np.flatnonzero(np.isin(codes, wanted))
+        else:
+            positions[df_alias] = selected[np.isin(codes[selected], wanted)]
+
+    return {alias: df.iloc[positions[alias]] if alias in positions else df
+            for alias, df in dfs.items()}
+
+
+def convert_plain_params(plain_param_values: Dict[str, PlainParamValue]) -> Dict[str, Any]:
+    """
+    将普通参数转换为对应类型的值
+
+    Args:
+        plain_param_values (Dict[str, PlainParamValue]): 参数名 -> 参数值
+
+    Returns:
+        Dict[str, Any]: 参数名 -> 转换后的值
+    """
+    converted = {}
+    for param_name, param_value in plain_param_values.items():
+        if isinstance(param_value, PlainParamValue) and param_value.type == 'single' and isinstance(param_value.value, str):
+            converted[param_name] = convert_plain_param_value(
+                param_value.value, param_value.valueType)
+        elif isinstance(param_value, PlainParamValue) and param_value.type == 'multiple' and isinstance(param_value.value, list):
+            converted[param_name] = [convert_plain_param_value(
+                value, param_value.valueType) for value in param_value.value]
+        else:
+            raise ValueError(
+                f"[PARAMS] Invalid plain param value: {param_value}, should be a list or a string.")
+    return converted
+
+
+def build_artifact_data_context(result: Any) -> ArtifactDataContext:
+    """根据 result 的类型构造对应的数据上下文"""
+    if isinstance(result, str):
+        return ArtifactTextDataContext(type="text", data=result)
+    # elif isinstance(result, plotly.graph_objs._figure.Figure):
+    if 'plotly' in str(type(result)):
+        return ArtifactPlotlyDataContext(type="plotly", data=result.to_json())
+    if 'pyecharts' in str(type(result)):
+        return ArtifactEChartDataContext(type="echart", data=result.dump_options())
+    if 'matplotlib' in str(type(result)):
+        # 将图表保存为BytesIO对象
+        buf = io.BytesIO()
+        result.savefig(buf, format='png')
+        buf.seek(0)
+        base64_image = base64.b64encode(buf.read()).decode('utf-8')
+        buf.close()
+        return ArtifactImageDataContext(type="image", data=base64_image)
+    if isinstance(result, bytes):
+        # 处理直接返回图片 bytes 的情况（如 screenshot_bytes）
+        base64_image = base64.b64encode(result).decode('utf-8')
+        return ArtifactImageDataContext(type="image", data=base64_image)
+    if 'altair' in str(type(result)):
+        return ArtifactAltairDataContext(type="altair", data=json.dumps(result.to_dict()))
+    if "pandas.core.frame.DataFrame" in str(type(result)):
+        return ArtifactTableDataContext(
+            type="table", data=result.to_json(orient='records', date_format='iso', force_ascii=False))
+    # if 'PerspectiveWidget' in str(type(result)):
+    #     widget_df = result.table.view().to_pandas()
+    #     widget_config = json.dumps(result.save())
+    #     return ArtifactPerspectiveDataContext(
+    #         type="perspective", data=widget_df.to_json(orient='records', date_format='iso', force_ascii=False), config=widget_config)
+    if type(result) == tuple and len(result) == 2 and "pandas.core.frame.DataFrame" in str(type(result[0])) and type(result[1]) == dict:
+        # table = perspective.table(result[0])
+        # widget_df = table.view().to_pandas()
+        widget_df = result[0].reset_index()
+        widget_config = json.dumps(result[1])
+        return ArtifactPerspectiveDataContext(
+            type="perspective", data=widget_df.to_json(orient='records', date_format='iso', force_ascii=False), config=widget_config)
+    # 默认转换为文本
+    return ArtifactTextDataContext(type="text", data=str(result))
+
+
+def run_artifact(code: str,
+                 dfs: Dict[str, pd.DataFrame],
+                 plain_param_values: Dict[str, PlainParamValue],
+                 cascader_param_values: Dict[str, List[List[str]]],
+                 inferred_param_values: Dict[str, Any],
+                 dfAliasUniqueIds: Optional[Dict[str, str]] = None) -> ArtifactResult:
+    """
+    应用参数并执行 artifact 代码，在 artifact 执行器的线程中运行
+
+    Args:
+        code (str): artifact 代码
+        dfs (Dict[str, pd.DataFrame]): 数据源别名 -> DataFrame
+        plain_param_values (Dict[str, PlainParamValue]): 普通参数
+        cascader_param_values (Dict[str, List[List[str]]]): cascader 参数
+        inferred_param_values (Dict[str, Any]): inferred 参数
+        dfAliasUniqueIds (Optional[Dict[str, str]]): 加载了完整结果的数据源别名 -> 查询结果ID，用于复用过滤索引
+
+    Returns:
+        ArtifactResult: 数据上下文, 捕获的输出, 提示信息
+
+    Raises:
+        ArtifactCodeError: 用户代码执行出错
+        SandboxLimitError: 超出 CPU 时间限制
+    """
+    dfs = filter_artifact_dataframes(
+        dfs, cascader_param_values, inferred_param_values, dfAliasUniqueIds)
+
+    # 创建本地变量空间，包含DataFrame对象和参数
+    local_vars = {
+        **dfs,  # 数据源
+        **convert_plain_params(plain_param_values)
+    }
+
+    # 捕获本线程的输出
+    with capture_stdout() as text_output:
+        try:
+            exec(compile_user_code(code, "artifact"), local_vars)
+        except (MemoryError, SandboxLimitError):
+            # 由沙箱转换为资源限制错误
+            raise
+        except Exception as e:
+            # 输出中附带用户代码内的 traceback，行号对应用户代码
+            raise ArtifactCodeError(
+                str(type(e)), str(e), text_output.getvalue() + format_user_traceback(e))
+    captured_output = text_output.getvalue()
+
+    alerts = []
+    # 检查是否有输出结果变量
+    if "result" in local_vars:
+        data_context = build_artifact_data_context(local_vars["result"])
+    elif captured_output:
+        # 如果没有result变量，返回标准输出内容
+        data_context = ArtifactTextDataContext(
+            type="text", data=captured_output)
+    else:
+        data_context = None
+        alerts.append(
+            Alert(type="warning", message="No result or output from code execution"))
+    return data_context, captured_output, alerts
+
+
+def build_pushdown_predicates(df_alias: str,
+                              cascader_param_values: Dict[str, List[List[str]]],
+                              inferred_param_values: Dict[str, Any]) -> List[Tuple[str, List[str], bool]]:
+    """
+    由 cascader/inferred 参数推导出可下推到缓存读取的谓词(精确过滤的必要条件)
+
+    - cascader: 所有路径都覆盖的层级，列值必须是某条路径在该层的值
+    - inferred: 列值转换为小写后必须是选中的值之一
+
+    Returns:
+        List[Tuple[str, List[str], bool]]: (列, 允许的字符串值, 是否先转换为小写)
+    """
+    predicates = []
+    for param_name, param_values in cascader_param_values.items():
+        alias, columns = param_name.split(",")[0], param_name.split(",")[1:]
+        if alias != df_alias or len(param_values) == 0 or len(param_values[0]) == 0:
+            continue
+        depth = min(min(len(path), len(columns)) for path in param_values)
+        for level in range(depth):
+            predicates.append((columns[level], sorted(
+                {path[level] for path in param_values}), False))
+    for param_name, param_value in inferred_param_values.items():
+        alias, column = param_name.split('.')[:2]
+        if alias != df_alias:
+            continue
+        values = [param_value] if isinstance(
+            param_value, str) else list(param_value)
+        predicates.append((column, values, True))
+    return predicates
+
+
+def load_artifact_dataframes(dfAliasUniqueIds: Dict[str, str],
+                             cascader_param_values: Optional[Dict[str, List[List[str]]]] = None,
+                             inferred_param_values: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+    """
+    加载 artifact 依赖的所有数据源查询结果；有 cascader/inferred 参数的数据源把参数推导出的谓词
+    下推到缓存读取，只物化可能匹配的行，精确过滤仍由 filter_artifact_dataframes 完成
+
+    Returns:
+        Tuple[Dict[str, pd.DataFrame], Dict[str, str]]: 数据源别名 -> DataFrame,
+        加载了完整结果的数据源别名 -> 查询结果ID(可复用过滤索引)
+
+    Raises:
+        DataSourceLoadError: 某个数据源加载失败
+    """
+    dfs, full = {}, {}
+    for alias, uniqueId in dfAliasUniqueIds.items():
+        try:
+            predicates = build_pushdown_predicates(
+                alias, cascader_param_values or {}, inferred_param_values or {})
+            df = load_query_result_filtered(
+                uniqueId, predicates) if predicates else None
+            if df is None:
+                df = load_query_result(uniqueId)
+                full[alias] = uniqueId
+            dfs[alias] = df
+        except Exception as e:
+            raise DataSourceLoadError(
+                alias, f"Failed to load query result: {str(e)}")
+    return dfs, full
+
+
+def run_artifact_task(code: str,
+                      dfAliasUniqueIds: Dict[str, str],
+                      plain_param_values: Dict[str, PlainParamValue],
+                      cascader_param_values: Dict[str, List[List[str]]],
+                      inferred_param_values: Dict[str, Any]) -> ArtifactResult:
+    """在沙箱 worker 中执行: 直接从缓存文件加载数据源，避免在进程间传递 DataFrame"""
+    dfs, full = load_artifact_dataframes(
+        dfAliasUniqueIds, cascader_param_values, inferred_param_values)
+    return run_artifact(code, dfs, plain_param_values, cascader_param_values, inferred_param_values, full)
+
+
+def build_artifact_code(code: str,
+                        dfs: Dict[str, pd.DataFrame],
+                        plain_param_values: Dict[str, PlainParamValue],
+                        cascader_param_values: Dict[str, List[List[str]]],
+                        inferred_param_values: Dict[str, Any],
+                        dfAliasUniqueIds: Optional[Dict[str, str]] = None) -> str:
+    """
+    生成可独立运行的 artifact 代码(内嵌过滤后的数据与参数)，用于复制到剪贴板
+
+    Returns:
+        str: Python 代码
+    """
+    dfs = filter_artifact_dataframes(
+        dfs, cascader_param_values, inferred_param_values, dfAliasUniqueIds)
+    plain_params = convert_plain_params(plain_param_values)
+
+    # import
+    import_context = "# import\n" + "import io\n" + \
+        "import json\n" + "import pandas as pd\n"
+    # data
+    data_context = "# data\n" + \
+        "\n".join([f"{df_alias} = pd.read_json(io.StringIO({repr(df_value.to_json(orient='records', date_format='iso', force_ascii=False).strip())}))" for df_alias, df_value in dfs.items()])
+    # param
+    params_context = "# params\n" + \
+        f"globals().update(json.loads(\"\"\"{json.dumps(plain_params)}\"\"\"))"
+    return import_context + "\n\n" + params_context + "\n\n" + \
+        data_context + "\n\n" + "# code\n" + code
@@ -0,0 +1,1252 @@
+import os
+import json
+import logging
+import mmap
+import time
+import shutil
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as pa_ds
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from utils.fs_utils import FILE_CACHE_PATH, QUERY_MARKER_DIR
+from utils.executor_utils import run_in_executor
+from utils.stats_utils import compute_query_stats
+
+logger = logging.getLogger(__name__)
+
+# 查询结果缓存的存储格式: arrow(Arrow IPC) / parquet / json(旧格式)
+QUERY_CACHE_FORMAT = os.environ.get("DATAVIZ_CACHE_FORMAT", "arrow")
+# 列式格式的压缩算法
+QUERY_CACHE_COMPRESSION = os.environ.get("DATAVIZ_CACHE_COMPRESSION", "zstd")
+# 使用内存映射读取 Arrow IPC 缓存: 文件不压缩，多个 worker 进程共享同一份页缓存
+QUERY_CACHE_MMAP = os.environ.get("DATAVIZ_CACHE_MMAP", "0") == "1"
+# 列式缓存每个 record batch / row group 的行数，过滤下推时只读取包含匹配行的批次；
+# 内存映射模式下整表写为一个批次，保持读取时零拷贝
+QUERY_CACHE_BATCH_ROWS = int(os.environ.get(
+    "DATAVIZ_CACHE_BATCH_ROWS", 131072))
+# 过滤下推后匹配行的比例超过该值时，改为加载整个结果(并放入进程内缓存)
+PUSHDOWN_MAX_FRACTION = float(os.environ.get(
+    "DATAVIZ_PUSHDOWN_MAX_FRACTION", 0.5))
+# 进程内 DataFrame 缓存的内存上限(字节)
+DF_CACHE_MAX_BYTES = int(os.environ.get(
+    "DATAVIZ_DF_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+# 进程内 inferred 参数过滤索引的内存上限(字节)
+FILTER_INDEX_MAX_BYTES = int(os.environ.get(
+    "DATAVIZ_FILTER_INDEX_MAX_BYTES", 128 * 1024 * 1024))
+# files_cache 的清理策略: 总大小上限(字节)、最长保留时间、最近访问保护期(秒)、清理间隔(秒)
+CACHE_MAX_BYTES = int(os.environ.get(
+    "DATAVIZ_CACHE_MAX_BYTES", 20 * 1024 * 1024 * 1024))
+CACHE_MAX_AGE_SECONDS = int(os.environ.get(
+    "DATAVIZ_CACHE_MAX_AGE_SECONDS", 7 * 24 * 3600))
+CACHE_PROTECT_SECONDS = int(os.environ.get(
+    "DATAVIZ_CACHE_PROTECT_SECONDS", 600))
+CACHE_JANITOR_INTERVAL_SECONDS = int(os.environ.get(
+    "DATAVIZ_CACHE_JANITOR_INTERVAL_SECONDS", 600))
+# 后台写入查询结果: 写入线程数、排队上限、读取方等待写入完成的超时时间(秒)
+CACHE_WRITER_THREADS = int(os.environ.get("DATAVIZ_CACHE_WRITER_THREADS", 2))
+CACHE_WRITER_MAX_PENDING = int(os.environ.get(
+    "DATAVIZ_CACHE_WRITER_MAX_PENDING", 16))
+CACHE_WRITE_WAIT_TIMEOUT = int(os.environ.get(
+    "DATAVIZ_CACHE_WRITE_WAIT_TIMEOUT", 120))
+
+
+def _copy_on_write_enabled() -> bool:
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return True
+    try:
+        return pd.get_option("mode.copy_on_write") is True
+    except Exception:
+        return False
+
+
+def _copy_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """返回缓存帧的副本；pandas开启Copy-on-Write时浅拷贝即可隔离用户代码的修改"""
+    return df.copy(deep=not _copy_on_write_enabled())
+
+
+class DataFrameLRUCache:
+    """
+    按 uniqueId 缓存已加载的 DataFrame，超出内存预算时淘汰最久未使用的条目
+
+    每个条目记录缓存文件的版本(mtime/size/inode)，文件被其他进程替换后自动失效；
+    write_through 为 True 时，新保存的查询结果直接放入缓存
+    """
+
+    def __init__(self, max_bytes: int, write_through: bool = True):
+        self.max_bytes = max_bytes
+        self.write_through = write_through
+        self._entries: "OrderedDict[str, Tuple[pd.DataFrame, int, Optional[tuple]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, version: Optional[tuple] = None) -> Optional[pd.DataFrame]:
+        """
+        获取缓存的 DataFrame，返回的是副本，用户代码的修改不会污染缓存
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (version is not None and entry[2] != version):
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            df = entry[0]
+        return _copy_frame(df)
+
+    def put(self, key: str, df: pd.DataFrame, version: Optional[tuple] = None):
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            # 单个结果超过预算时不缓存
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (df, size, version)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def resize(self, max_bytes: int):
+        """调整内存预算，立即淘汰超出预算的条目"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            while self.current_bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def contains(self, key: str, version: Optional[tuple] = None) -> bool:
+        """是否缓存了指定版本的 DataFrame(不计入命中统计)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (version is None or entry[2] == version)
+
+    def pop(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "currentBytes": self.current_bytes,
+                "maxBytes": self.max_bytes,
+                "writeThrough": self.write_through,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# 进程内的查询结果缓存
+query_result_memory_cache = DataFrameLRUCache(DF_CACHE_MAX_BYTES)
+
+
+class FilterIndexCache:
+    """
+    按 (uniqueId, 列) 缓存查询结果的过滤索引(每行的整数编码与 值->编码 字典)，
+    超出内存预算时淘汰最久未使用的条目；条目记录缓存文件的版本，结果被替换后自动失效
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Tuple[np.ndarray, Dict[str, int]], int, Optional[tuple]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _size(index: Tuple[np.ndarray, Dict[str, int]]) -> int:
+        codes, mapping = index
+        # 字典按每个键约 100 字节估算
+        return int(codes.nbytes) + sum(len(value) + 100 for value in mapping)
+
+    def get(self, uniqueId: str, column: str, version: Optional[tuple]) -> Optional[Tuple[np.ndarray, Dict[str, int]]]:
+        key = (uniqueId, column)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] != version:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, uniqueId: str, column: str, index: Tuple[np.ndarray, Dict[str, int]], version: Optional[tuple]):
+        key = (uniqueId, column)
+        size = self._size(index)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            # 单个索引超过预算时不缓存
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (index, size, version)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: Tuple[str, str]):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "currentBytes": self.current_bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# 进程内的 inferred 参数过滤索引缓存
+filter_index_cache = FilterIndexCache(FILTER_INDEX_MAX_BYTES)
+
+
+def _table_to_pandas(table: pa.Table) -> pd.DataFrame:
+    # split_blocks 避免合并成二维块，无空值的定长列可以直接引用 Arrow 缓冲区(零拷贝)
+    return table.to_pandas(split_blocks=True)
+
+
+# 列式缓存的 schema 元数据中记录含空值的列，过滤下推时无需读取整列即可确定 dtype
+NULL_COLUMNS_METADATA_KEY = b"dataviz.null_columns"
+
+
+def _to_cache_table(df: pd.DataFrame) -> pa.Table:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    null_columns = [field.name for field, column in zip(table.schema, table.columns)
+                    if column.null_count > 0]
+    return table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        NULL_COLUMNS_METADATA_KEY: json.dumps(null_columns, ensure_ascii=False).encode("utf-8"),
+    })
+
+
+def _schema_null_columns(schema: pa.Schema) -> Optional[set]:
+    """写入时记录的含空值的列；旧的缓存文件没有记录时返回 None"""
+    value = (schema.metadata or {}).get(NULL_COLUMNS_METADATA_KEY)
+    return set(json.loads(value)) if value is not None else None
+
+
+def _write_arrow(path: Path, df: pd.DataFrame):
+    table = _to_cache_table(df)
+    # 压缩后的缓冲区必须解压到堆内存，内存映射模式下不压缩
+    compression = None if QUERY_CACHE_MMAP else (
+        QUERY_CACHE_COMPRESSION or None)
+    options = ipc.IpcWriteOptions(compression=compression)
+    with pa.OSFile(str(path), "wb") as sink:
+        with ipc.new_file(sink, table.schema, options=options) as writer:
+            writer.write_table(table, max_chunksize=None if QUERY_CACHE_MMAP else (
+                QUERY_CACHE_BATCH_ROWS or None))
+
+
+def _read_ipc(source, columns: Optional[List[str]] = None, mapped: bool = False) -> pa.Table:
+    reader = ipc.open_file(source)
+    if columns is None:
+        return reader.read_all()
+    names = reader.schema.names
+    missing = [column for column in columns if column not in names]
+    if missing:
+        raise KeyError(f"Columns not found: {missing}")
+    if mapped:
+        # 映射的文件整表读取是零拷贝的；按列读取(included_fields)反而会把缓冲区复制出映射
+        return reader.read_all().select(columns)
+    # 只解码需要的列
+    options = ipc.IpcReadOptions(
+        included_fields=[names.index(column) for column in columns])
+    table = ipc.open_file(source, options=options).read_all()
+    return table.select(columns)
+
+
+def _read_arrow_table(path: Path, columns: Optional[List[str]] = None) -> pa.Table:
+    if QUERY_CACHE_MMAP:
+        # 未压缩的缓冲区直接指向映射的页面，不会复制到进程私有内存
+        return _read_ipc(pa.memory_map(str(path), "r"), columns, mapped=True)
+    with pa.OSFile(str(path), "rb") as source:
+        return _read_ipc(source, columns)
+
+
+def _mapped_table_to_pandas(table: pa.Table, mapped: mmap.mmap, buffer: pa.Buffer) -> pd.DataFrame:
+    """
+    将私有映射上的表转换为 DataFrame: 无空值的数值列直接以可写的 numpy 数组引用映射的页面，
+    其余列(字符串、含空值、扩展类型等)按常规转换
+    """
+    df = _table_to_pandas(table)
+    columns = {}
+    for index, column in enumerate(table.columns):
+        series = df.iloc[:, index]
+        if (column.num_chunks == 1 and len(column) > 0 and column.null_count == 0
+                and (pa.types.is_integer(column.type) or pa.types.is_floating(column.type))
+                and series.dtype == np.dtype(column.type.to_pandas_dtype())):
+            chunk = column.chunk(0)
+            offset = chunk.buffers()[1].address - buffer.address + \
+                chunk.offset * series.dtype.itemsize
+            # 缓冲区不在映射范围内(读取时已复制)时保留常规转换的结果
+            if 0 <= offset and offset + len(chunk) * series.dtype.itemsize <= buffer.size:
+                series = np.frombuffer(mapped, dtype=series.dtype,
+                                       count=len(chunk), offset=offset)
+        columns[index] = series
+    # copy=False: 每列保持独立的块，不合并(合并会复制数据)
+    result = pd.DataFrame(columns, copy=False)
+    result.columns = df.columns
+    result.index = df.index
+    return result
+
+
+def _read_arrow(path: Path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    if not QUERY_CACHE_MMAP:
+        return _table_to_pandas(_read_arrow_table(path, columns))
+    # 私有(写时复制)映射: 未修改的页面与其他进程共享页缓存，用户代码修改数据时只复制被写入的页面，
+    # 不会写回缓存文件，也不会影响其他读取方
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    buffer = pa.py_buffer(mapped)
+    return _mapped_table_to_pandas(_read_ipc(buffer, columns, mapped=True), mapped, buffer)
+
+
+def _split_positions(positions: np.ndarray, lengths: List[int]) -> List[Tuple[int, np.ndarray]]:
+    """将全局行位置按批次拆分为 (批次序号, 批次内的行位置)，跳过没有匹配行的批次"""
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    bounds = np.searchsorted(positions, offsets)
+    return [(index, positions[bounds[index]:bounds[index + 1]] - offsets[index])
+            for index in range(len(lengths)) if bounds[index + 1] > bounds[index]]
+
+
+def _is_mapped(path: Path) -> bool:
+    """读取该缓存文件得到的 DataFrame 是否直接引用映射的页面(此时不放入进程内缓存)"""
+    return QUERY_CACHE_MMAP and path.name.endswith(".arrow")
+
+
+def _read_arrow_rows(path: Path, positions: np.ndarray, lengths: List[int]) -> List[pa.RecordBatch]:
+    """只解码包含匹配行的 record batch，并取出其中的匹配行"""
+    def read(source):
+        reader = ipc.open_file(source)
+        if reader.num_record_batches != len(lengths):
+            raise ValueError("Record batch layout mismatch")
+        return [reader.get_batch(index).take(pa.array(rows))
+                for index, rows in _split_positions(positions, lengths)]
+
+    if QUERY_CACHE_MMAP:
+        return read(pa.memory_map(str(path), "r"))
+    with pa.OSFile(str(path), "rb") as source:
+        return read(source)
+
+
+def _write_parquet(path: Path, df: pd.DataFrame):
+    table = _to_cache_table(df)
+    pq.write_table(table, str(path),
+                   compression=QUERY_CACHE_COMPRESSION or "none",
+                   row_group_size=QUERY_CACHE_BATCH_ROWS or None)
+
+
+def _read_parquet_table(path: Path, columns: Optional[List[str]] = None) -> pa.Table:
+    return pq.read_table(str(path), columns=columns, memory_map=QUERY_CACHE_MMAP)
+
+
+def _read_parquet(path: Path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    return _table_to_pandas(_read_parquet_table(path, columns))
+
+
+def _read_parquet_rows(path: Path, positions: np.ndarray, lengths: List[int]) -> List[pa.RecordBatch]:
+    """只读取包含匹配行的 row group，并取出其中的匹配行"""
+    parquet_file = pq.ParquetFile(str(path), memory_map=QUERY_CACHE_MMAP)
+    metadata = parquet_file.metadata
+    # 以 row group 为准拆分行位置
+    lengths = [metadata.row_group(index).num_rows
+               for index in range(metadata.num_row_groups)]
+    return [batch for index, rows in _split_positions(positions, lengths)
+            for batch in parquet_file.read_row_group(index).take(pa.array(rows)).to_batches()]
+
+
+def _write_json(path: Path, df: pd.DataFrame):
+    with open(path, "w") as f:
+        f.write(df.to_json(orient="records"))
+
+
+def _read_json(path: Path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    with open(path, "r") as f:
+        df = pd.read_json(f)
+    return df[columns] if columns is not None else df
+
+
+def _read_json_table(path: Path, columns: Optional[List[str]] = None) -> pa.Table:
+    return pa.Table.from_pandas(_read_json(path, columns), preserve_index=False)
+
+
+def _open_arrow_dataset(path: Path):
+    return pa_ds.dataset(str(path), format="ipc")
+
+
+def _open_parquet_dataset(path: Path):
+    return pa_ds.dataset(str(path), format="parquet")
+
+
+# 可插拔的缓存格式: 格式名 -> 文件后缀与读写函数；dataset 用于按需扫描(列裁剪)，
+# read_rows 按批次读取部分行(过滤下推)，json 只能整体读取
+CACHE_FORMATS = {
+    "arrow": {"suffix": ".arrow", "write": _write_arrow, "read": _read_arrow, "read_table": _read_arrow_table,
+              "dataset": _open_arrow_dataset, "read_rows": _read_arrow_rows},
+    "parquet": {"suffix": ".parquet", "write": _write_parquet, "read": _read_parquet, "read_table": _read_parquet_table,
+                "dataset": _open_parquet_dataset, "read_rows": _read_parquet_rows},
+    "json": {"suffix": ".data", "write": _write_json, "read": _read_json, "read_table": _read_json_table,
+             "dataset": _read_json_table, "read_rows": None},
+}
+
+
+def _format_search_order():
+    """优先查找当前配置的格式，其余格式(含旧的.data)用于兼容历史缓存"""
+    names = [QUERY_CACHE_FORMAT] + \
+        [name for name in CACHE_FORMATS if name != QUERY_CACHE_FORMAT]
+    return [name for name in names if name in CACHE_FORMATS]
+
+
+def find_query_result_path(uniqueId: str) -> Optional[Path]:
+    """
+    查找查询结果的缓存文件
+
+    Args:
+        uniqueId (str): 查询结果ID
+
+    Returns:
+        Optional[Path]: 缓存文件路径, 不存在则返回 None
+    """
+    for name in _format_search_order():
+        path = Path(FILE_CACHE_PATH) / f"{uniqueId}{CACHE_FORMATS[name]['suffix']}"
+        if path.exists():
+            return path
+    return None
+
+
+def _path_format(path: Path) -> dict:
+    for cache_format in CACHE_FORMATS.values():
+        if path.name.endswith(cache_format["suffix"]):
+            return cache_format
+    raise ValueError(f"Unsupported cache file: {path.name}")
+
+
+def _file_version(path: Path) -> Optional[tuple]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def _touch(path: Path):
+    """记录访问时间(atime)，mtime 保持为写入时间"""
+    try:
+        stat = path.stat()
+        os.utime(path, ns=(time.time_ns(), stat.st_mtime_ns))
+    except OSError:
+        pass
+
+
+def save_query_result(uniqueId: str, df: pd.DataFrame, stats: Optional[dict] = None):
+    """
+    按配置的格式保存查询结果；列式格式无法表示的数据(如混合类型的列)退回json格式
+
+    Args:
+        uniqueId (str): 查询结果ID
+        df (pd.DataFrame): 查询结果
+        stats (Optional[dict]): 查询结果的统计信息，写在结果旁边
+    """
+    cache_dir = Path(FILE_CACHE_PATH)
+    cache_format = CACHE_FORMATS.get(QUERY_CACHE_FORMAT)
+    if cache_format is None:
+        raise ValueError(f"Unsupported cache format: {QUERY_CACHE_FORMAT}")
+
+    path = cache_dir / f"{uniqueId}{cache_format['suffix']}"
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        cache_format["write"](tmp_path, df)
+    except (pa.ArrowException, TypeError, ValueError) as e:
+        logger.warning("列式缓存写入失败, 改用json格式: %s", e)
+        if tmp_path.exists():
+            os.remove(tmp_path)
+        cache_format = CACHE_FORMATS["json"]
+        path = cache_dir / f"{uniqueId}{cache_format['suffix']}"
+        tmp_path = path.with_name(path.name + ".tmp")
+        cache_format["write"](tmp_path, df)
+    os.replace(tmp_path, path)
+
+    # 移除同一 uniqueId 其他格式的旧文件，避免读到过期结果
+    for name, other in CACHE_FORMATS.items():
+        other_path = cache_dir / f"{uniqueId}{other['suffix']}"
+        if other_path != path and other_path.exists():
+            os.remove(other_path)
+
+    # 写穿到内存缓存，首次执行 artifact 时无需再读文件(artifact 在沙箱 worker 中执行时不写穿)
+    if query_result_memory_cache.write_through and not _is_mapped(path):
+        query_result_memory_cache.put(uniqueId, df, _file_version(path))
+
+    if stats is not None:
+        save_query_stats(uniqueId, stats)
+    else:
+        _remove_query_stats(uniqueId)
+
+
+def _stats_path(uniqueId: str) -> Path:
+    return Path(FILE_CACHE_PATH) / f"{uniqueId}.stats.json"
+
+
+def _remove_query_stats(uniqueId: str):
+    try:
+        os.remove(_stats_path(uniqueId))
+    except FileNotFoundError:
+        pass
+
+
+def save_query_stats(uniqueId: str, stats: dict):
+    """
+    保存查询结果的统计信息(<uniqueId>.stats.json)，记录对应结果文件的版本；
+    结果文件被替换后，旧的统计信息自动失效
+
+    Args:
+        uniqueId (str): 查询结果ID
+        stats (dict): 统计信息
+    """
+    path = find_query_result_path(uniqueId)
+    version = _file_version(path) if path is not None else None
+    if version is None:
+        raise FileNotFoundError(f"Query result {uniqueId} not found")
+
+    stats_path = _stats_path(uniqueId)
+    # 同一结果的统计信息可能被多个请求同时更新(cascader 组合)
+    tmp_path = stats_path.with_name(
+        f"{stats_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({**stats, "version": list(version)}, f, ensure_ascii=False)
+    os.replace(tmp_path, stats_path)
+
+
+def load_query_stats(uniqueId: str) -> Optional[dict]:
+    """
+    读取查询结果的统计信息
+
+    Args:
+        uniqueId (str): 查询结果ID
+
+    Returns:
+        Optional[dict]: 统计信息；不存在或与当前结果文件不匹配时返回 None
+    """
+    path = find_query_result_path(uniqueId)
+    version = _file_version(path) if path is not None else None
+    if version is None:
+        return None
+    try:
+        with open(_stats_path(uniqueId), encoding="utf-8") as f:
+            stats = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if stats.pop("version", None) != list(version):
+        return None
+    return stats
+
+
+def get_query_result_age(uniqueId: str) -> Optional[float]:
+    """
+    查询结果写入至今的秒数
+
+    Args:
+        uniqueId (str): 查询结果ID
+
+    Returns:
+        Optional[float]: 结果的年龄，不存在则返回 None
+    """
+    path = find_query_result_path(uniqueId)
+    if path is None:
+        return None
+    try:
+        return max(0.0, time.time() - path.stat().st_mtime)
+    except FileNotFoundError:
+        return None
+
+
+def link_query_result(src_uniqueId: str, dst_uniqueId: str):
+    """
+    让 dst_uniqueId 指向 src_uniqueId 的查询结果(硬链接，不支持时复制)，
+    包括结果文件和附属文件
+
+    Args:
+        src_uniqueId (str): 已有的查询结果ID
+        dst_uniqueId (str): 新的查询结果ID
+    """
+    cache_dir = Path(FILE_CACHE_PATH)
+    src_path = find_query_result_path(src_uniqueId)
+    if src_path is None:
+        raise FileNotFoundError(f"Query result {src_uniqueId} not found")
+
+    for path in cache_dir.glob(f"{src_uniqueId}.*"):
+        if path.name.endswith((".tmp", ".pending")):
+            continue
+        dst_path = cache_dir / (dst_uniqueId + path.name[len(src_uniqueId):])
+        # 已经是同一个文件时跳过(对同一文件的两个链接 rename 不做任何操作，会留下临时文件)
+        try:
+            if os.path.samefile(path, dst_path):
+                continue
+        except FileNotFoundError:
+            pass
+        tmp_path = dst_path.with_name(dst_path.name + ".tmp")
+        if tmp_path.exists():
+            os.remove(tmp_path)
+        try:
+            os.link(path, tmp_path)
+        except OSError:
+            shutil.copy2(path, tmp_path)
+        os.replace(tmp_path, dst_path)
+
+    # 移除 dst 其他格式的旧结果文件
+    for cache_format in CACHE_FORMATS.values():
+        other_path = cache_dir / f"{dst_uniqueId}{cache_format['suffix']}"
+        if other_path.name != dst_uniqueId + src_path.name[len(src_uniqueId):] and other_path.exists():
+            os.remove(other_path)
+
+
+def _pending_marker_path(uniqueId: str) -> Path:
+    """写入中的标记文件，让其他 worker 进程知道结果尚未落盘"""
+    return Path(FILE_CACHE_PATH) / f"{uniqueId}.pending"
+
+
+class QueryResultWriter:
+    """
+    在后台线程中持久化查询结果，请求无需等待写盘；
+    排队的写入超过上限时，提交方等待最早的写入完成(背压)
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="cache-writer")
+        self._pending: "OrderedDict[str, Future]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.written = 0
+        self.failed = 0
+
+    def get_pending(self, uniqueId: str) -> Optional[Future]:
+        with self._lock:
+            return self._pending.get(uniqueId)
+
+    async def submit(self, uniqueId: str, df: pd.DataFrame, link_to: Optional[List[str]] = None,
+                     cascaders: Optional[dict] = None):
+        """
+        提交写入任务，统计信息在写入时计算，不占用请求的时间
+
+        Args:
+            uniqueId (str): 查询结果ID
+            df (pd.DataFrame): 查询结果
+            link_to (Optional[List[str]]): 写入完成后额外链接到的ID(如内容键)
+            cascaders (Optional[dict]): 请求中已计算的 cascader 组合，一并保存到统计信息
+        """
+        # 同一 uniqueId 的写入按顺序进行，避免旧结果覆盖新结果
+        await wait_query_result_written(uniqueId, raise_error=False)
+        while True:
+            with self._lock:
+                pending = list(dict.fromkeys(self._pending.values()))
+                if len(pending) < self.max_pending:
+                    break
+                oldest = pending[0]
+            await asyncio.shield(asyncio.wrap_future(oldest))
+
+        # 链接目标(如内容键)在写入完成前同样视为写入中
+        keys = [uniqueId] + list(link_to or [])
+        for key in keys:
+            _pending_marker_path(key).touch()
+        with self._lock:
+            future = self._executor.submit(
+                self._write, uniqueId, df, link_to or [], cascaders)
+            for key in keys:
+                self._pending[key] = future
+        future.add_done_callback(
+            lambda f: self._on_done(keys, f))
+
+    def _write(self, uniqueId: str, df: pd.DataFrame, link_to: List[str], cascaders: Optional[dict] = None):
+        try:
+            stats = compute_query_stats(df)
+            stats["cascaders"].update(cascaders or {})
+            save_query_result(uniqueId, df, stats)
+            for key in link_to:
+                link_query_result(uniqueId, key)
+        except Exception as e:
+            logger.exception("保存查询结果 %s 时发生错误: %s", uniqueId, e)
+            # 删除同一 uniqueId 的旧结果，避免读取方拿到过期数据
+            for cache_format in CACHE_FORMATS.values():
+                path = Path(FILE_CACHE_PATH) / \
+                    f"{uniqueId}{cache_format['suffix']}"
+                if path.exists():
+                    os.remove(path)
+            _remove_query_stats(uniqueId)
+            query_result_memory_cache.pop(uniqueId)
+            raise
+        finally:
+            for key in [uniqueId] + link_to:
+                try:
+                    os.remove(_pending_marker_path(key))
+                except FileNotFoundError:
+                    pass
+
+    def _on_done(self, keys: List[str], future: Future):
+        with self._lock:
+            for key in keys:
+                if self._pending.get(key) is future:
+                    del self._pending[key]
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            else:
+                self.written += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": len(set(self._pending.values())),
+                "maxPending": self.max_pending,
+                "written": self.written,
+                "failed": self.failed,
+            }
+
+    def shutdown(self):
+        """等待所有排队的写入完成"""
+        self._executor.shutdown(wait=True)
+
+
+# 进程内的查询结果写入队列
+query_result_writer = QueryResultWriter(
+    CACHE_WRITER_THREADS, CACHE_WRITER_MAX_PENDING)
+
+
+def _marker_is_fresh(marker: Path, timeout: float) -> bool:
+    try:
+        return time.time() - marker.stat().st_mtime < timeout
+    except FileNotFoundError:
+        return False
+
+
+async def wait_query_result_written(uniqueId: str, timeout: float = CACHE_WRITE_WAIT_TIMEOUT, raise_error: bool = True):
+    """
+    等待查询结果写入完成(包括其他 worker 进程中的写入)
+
+    Args:
+        uniqueId (str): 查询结果ID
+        timeout (float): 超时时间(秒)
+        raise_error (bool): 写入失败时是否抛出异常
+    """
+    future = query_result_writer.get_pending(uniqueId)
+    if future is not None:
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Query result {uniqueId} is still being written")
+        except Exception as e:
+            if raise_error:
+                raise ValueError(f"Failed to save query result: {e}")
+        return
+
+    # 标记文件过旧时视为写入进程已退出
+    marker = _pending_marker_path(uniqueId)
+    deadline = time.time() + timeout
+    while _marker_is_fresh(marker, timeout):
+        if time.time() > deadline:
+            raise TimeoutError(f"Query result {uniqueId} is still being written")
+        await asyncio.sleep(0.05)
+
+
+def _wait_query_result_written_sync(uniqueId: str, timeout: float = CACHE_WRITE_WAIT_TIMEOUT):
+    future = query_result_writer.get_pending(uniqueId)
+    if future is not None:
+        try:
+            future.result(timeout)
+        except Exception as e:
+            raise ValueError(f"Failed to save query result: {e}")
+        return
+
+    marker = _pending_marker_path(uniqueId)
+    deadline = time.time() + timeout
+    while _marker_is_fresh(marker, timeout):
+        if time.time() > deadline:
+            raise TimeoutError(f"Query result {uniqueId} is still being written")
+        time.sleep(0.05)
+
+
+def load_query_result(uniqueId: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    加载查询结果，优先命中进程内缓存，兼容旧的json(.data)缓存；
+    内存映射模式下 Arrow 缓存直接映射，不经过进程内缓存
+
+    Args:
+        uniqueId (str): 查询结果ID
+        columns (Optional[List[str]]): 只加载指定的列，None 表示全部列
+
+    Returns:
+        pd.DataFrame: 查询结果
+    """
+    _wait_query_result_written_sync(uniqueId)
+    path = find_query_result_path(uniqueId)
+    if path is None:
+        query_result_memory_cache.pop(uniqueId)
+        raise FileNotFoundError(f"Query result {uniqueId} not found")
+
+    _touch(path)
+    cache_format = _path_format(path)
+    if _is_mapped(path):
+        # 内存映射模式: 返回直接引用映射页面的 DataFrame(写时复制)，多个进程共享同一份页缓存；
+        # 不放入进程内缓存，也无需深拷贝
+        return cache_format["read"](path, columns)
+
+    version = _file_version(path)
+    df = query_result_memory_cache.get(uniqueId, version)
+    if df is not None:
+        return df[columns] if columns is not None else df
+
+    if columns is not None:
+        # 列投影只读取需要的列，不放入整帧缓存
+        return cache_format["read"](path, columns)
+
+    df = cache_format["read"](path)
+    query_result_memory_cache.put(uniqueId, df, version)
+    return _copy_frame(df)
+
+
+def _pushdown_mask(table: pa.Table, predicates: List[Tuple[str, List[str], bool]]) -> Optional[pa.ChunkedArray]:
+    """
+    将谓词转换为 Arrow 上的过滤条件；只处理字符串列，结果是精确过滤的超集:
+    空值(在 pandas 中转换为 'None'/'nan'/'')与非 ASCII 的值(大小写转换规则可能不同)总是保留
+
+    Returns:
+        Optional[pa.ChunkedArray]: 每行是否可能匹配，没有可下推的谓词时返回 None
+    """
+    mask = None
+    for column, values, lower in predicates:
+        if column not in table.column_names:
+            continue
+        data = table[column]
+        if not (pa.types.is_string(data.type) or pa.types.is_large_string(data.type)):
+            continue
+        target = pc.utf8_lower(data) if lower else data
+        keep = pc.or_kleene(pc.is_in(target, value_set=pa.array(values, type=data.type)),
+                            pc.is_null(data))
+        if lower:
+            keep = pc.or_kleene(keep, pc.invert(pc.string_is_ascii(data)))
+        keep = pc.fill_null(keep, True)
+        mask = keep if mask is None else pc.and_(mask, keep)
+    return mask
+
+
+def _restore_null_dtypes(df: pd.DataFrame, table: pa.Table, null_columns: set) -> pd.DataFrame:
+    """
+    整数/布尔列在整个结果中有空值时，pandas 转换为 float64/object；
+    部分行可能没有空值，需要转换为与加载整个结果时相同的 dtype。
+    pandas 元数据记录为扩展类型(如 Int64/boolean)的列，无论有无空值都还原为该类型，无需处理
+    """
+    for field in table.schema:
+        name = field.name
+        if name not in null_columns or table[name].null_count > 0:
+            continue
+        if isinstance(df[name].dtype, pd.api.extensions.ExtensionDtype):
+            continue
+        if pa.types.is_integer(field.type):
+            df[name] = df[name].astype("float64")
+        elif pa.types.is_boolean(field.type):
+            df[name] = df[name].astype(object)
+    return df
+
+
+def load_query_result_filtered(uniqueId: str, predicates: List[Tuple[str, List[str], bool]]) -> Optional[pd.DataFrame]:
+    """
+    加载查询结果中可能满足谓词的行(过滤下推): 先只读取谓词涉及的列计算匹配行，
+    再只解码包含匹配行的批次；返回的行保留在整个结果中的位置作为索引，
+    与加载整个结果后过滤得到的行、顺序与 dtype 一致；精确过滤仍需由调用方完成
+
+    Args:
+        uniqueId (str): 查询结果ID
+        predicates (List[Tuple[str, List[str], bool]]): (列, 允许的字符串值, 是否先转换为小写)
+
+    Returns:
+        Optional[pd.DataFrame]: 过滤后的结果；不适合下推(整个结果已在进程内缓存、json 格式、
+        没有可下推的字符串列、匹配行过多或旧的缓存文件无法确定 dtype)时返回 None，由调用方加载整个结果
+    """
+    _wait_query_result_written_sync(uniqueId)
+    path = find_query_result_path(uniqueId)
+    if path is None:
+        raise FileNotFoundError(f"Query result {uniqueId} not found")
+    cache_format = _path_format(path)
+    if cache_format["read_rows"] is None or query_result_memory_cache.contains(uniqueId, _file_version(path)):
+        return None
+
+    schema = cache_format["dataset"](path).schema
+    if any(pa.types.is_dictionary(field.type) for field in schema):
+        # 字典列在不同批次中的字典可能不同，转换后的 categories 无法保证一致
+        return None
+    columns = list(dict.fromkeys(
+        column for column, _, _ in predicates if column in schema.names))
+    if not columns:
+        return None
+    table = cache_format["read_table"](path, columns)
+    mask = _pushdown_mask(table, predicates)
+    if mask is None:
+        return None
+    positions = np.flatnonzero(mask.to_numpy(zero_copy_only=False))
+    if len(positions) > PUSHDOWN_MAX_FRACTION * table.num_rows:
+        return None
+
+    nullable = [field.name for field in schema
+                if pa.types.is_integer(field.type) or pa.types.is_boolean(field.type)]
+    null_columns = _schema_null_columns(schema)
+    if nullable and null_columns is None:
+        # 旧的缓存文件没有记录含空值的列，无法确定整数/布尔列的 dtype
+        return None
+
+    _touch(path)
+    lengths = [len(chunk) for chunk in table.column(0).chunks]
+    try:
+        batches = cache_format["read_rows"](path, positions, lengths)
+    except ValueError:
+        return None
+    selected = pa.Table.from_batches(batches, schema=schema)
+    df = _table_to_pandas(selected)
+    # 缓存写入时不保留索引，整个结果的索引即行位置
+    df.index = pd.Index(positions, dtype="int64")
+    if nullable:
+        df = _restore_null_dtypes(df, selected.select(nullable), null_columns)
+    return df
+
+
+def read_query_table(uniqueId: str, columns: Optional[List[str]] = None) -> pa.Table:
+    """
+    以 Arrow Table 的形式读取查询结果，内存映射模式下不复制数据
+
+    Args:
+        uniqueId (str): 查询结果ID
+        columns (Optional[List[str]]): 只读取指定的列，None 表示全部列
+
+    Returns:
+        pa.Table: 查询结果
+    """
+    _wait_query_result_written_sync(uniqueId)
+    path = find_query_result_path(uniqueId)
+    if path is None:
+        raise FileNotFoundError(f"Query result {uniqueId} not found")
+    _touch(path)
+    return _path_format(path)["read_table"](path, columns)
+
+
+def get_query_stats(uniqueId: str) -> dict:
+    """
+    读取查询结果的统计信息，不存在(如旧的缓存结果)时计算并保存
+
+    Args:
+        uniqueId (str): 查询结果ID
+
+    Returns:
+        dict: 统计信息
+    """
+    stats = load_query_stats(uniqueId)
+    if stats is None:
+        stats = compute_query_stats(load_query_result(uniqueId))
+        save_query_stats(uniqueId, stats)
+    return stats
+
+
+def open_query_dataset(uniqueId: str):
+    """
+    以 pyarrow Dataset 的形式打开查询结果，扫描时只读取用到的列(json 格式整体读取为 Table)
+
+    Args:
+        uniqueId (str): 查询结果ID
+
+    Returns:
+        pa_ds.Dataset | pa.Table: 查询结果
+    """
+    _wait_query_result_written_sync(uniqueId)
+    path = find_query_result_path(uniqueId)
+    if path is None:
+        raise FileNotFoundError(f"Query result {uniqueId} not found")
+    _touch(path)
+    return _path_format(path)["dataset"](path)
+
+
+def get_query_result_version(uniqueId: str) -> Optional[tuple]:
+    """
+    查询结果文件的版本，结果被重新写入后版本会变化
+
+    Args:
+        uniqueId (str): 查询结果ID
+
+    Returns:
+        Optional[tuple]: (mtime_ns, size, inode)，不存在则返回 None
+    """
+    path = find_query_result_path(uniqueId)
+    return _file_version(path) if path is not None else None
+
+
+def load_query_result_head(uniqueId: str, n: int = 5) -> pd.DataFrame:
+    """
+    读取查询结果的前 n 行
+
+    Args:
+        uniqueId (str): 查询结果ID
+        n (int): 行数
+
+    Returns:
+        pd.DataFrame: 前 n 行
+    """
+    return _table_to_pandas(read_query_table(uniqueId).slice(0, n))
+
+
+def read_query_result_page(uniqueId: str,
+                           offset: int = 0,
+                           limit: int = 1000,
+                           columns: Optional[List[str]] = None,
+                           sort_by: Optional[str] = None,
+                           descending: bool = False,
+                           filters: Optional[Dict[str, List[str]]] = None,
+                           after: Optional[str] = None,
+                           after_row: Optional[int] = None) -> Tuple[pa.Table, int, Optional[int]]:
+    """
+    分页读取查询结果，只读取投影、排序和过滤涉及的列，不加载整个 DataFrame
+
+    Args:
+        uniqueId (str): 查询结果ID
+        offset (int): 起始行(过滤、排序之后)
+        limit (int): 最多返回的行数
+        columns (Optional[List[str]]): 返回的列，None 表示全部列
+        sort_by (Optional[str]): 排序列
+        descending (bool): 是否降序
+        filters (Optional[Dict[str, List[str]]]): 列 -> 允许的值(按字符串比较)
+        after (Optional[str]): keyset 分页，只返回排序列在该值之后的行，需要 sort_by
+        after_row (Optional[int]): 与 after 配合使用，上一页最后一行的行号；排序列与 after 相等的行
+            只返回行号更大的部分，排序列有重复值时不会漏行。不传时只返回排序列严格在 after 之后的行
+
+    Returns:
+        Tuple[pa.Table, int, Optional[int]]: 当前页数据, 过滤后的总行数, 当前页最后一行的行号(空页为 None)
+    """
+    filters = filters or {}
+    if after is not None and sort_by is None:
+        raise ValueError("after requires sort_by")
+    if after_row is not None and after is None:
+        raise ValueError("after_row requires after")
+
+    needed = None
+    if columns is not None:
+        needed = list(dict.fromkeys(
+            columns + ([sort_by] if sort_by else []) + list(filters)))
+    table = read_query_table(uniqueId, needed)
+    if columns is None:
+        columns = table.column_names
+    for column in ([sort_by] if sort_by else []) + list(filters):
+        if column not in table.column_names:
+            raise KeyError(f"Column {column} not found")
+    # 行号: 结果中的原始位置，作为排序列相同的行之间的顺序
+    row_numbers = pa.array(np.arange(table.num_rows, dtype=np.int64))
+
+    mask = None
+    for column, values in filters.items():
+        condition = pc.is_in(pc.cast(table[column], pa.string()),
+                             value_set=pa.array(values, pa.string()))
+        mask = condition if mask is None else pc.and_(mask, condition)
+    if after is not None:
+        bound = pa.scalar(after).cast(table[sort_by].type)
+        condition = pc.less(table[sort_by], bound) if descending else pc.greater(
+            table[sort_by], bound)
+        if after_row is not None:
+            condition = pc.or_(condition, pc.and_(
+                pc.equal(table[sort_by], bound), pc.greater(row_numbers, after_row)))
+        mask = condition if mask is None else pc.and_(mask, condition)
+    if mask is not None:
+        table = table.filter(mask)
+        row_numbers = row_numbers.filter(mask)
+
+    total_rows = table.num_rows
+    if sort_by:
+        # 排序是稳定的，排序列相同的行按行号排列，与 after_row 的比较一致
+        indices = pc.sort_indices(
+            table, sort_keys=[(sort_by, "descending" if descending else "ascending")]).slice(offset, limit)
+        page = table.take(indices)
+        page_rows = row_numbers.take(indices)
+    else:
+        page = table.slice(offset, limit)
+        page_rows = row_numbers.slice(offset, limit)
+    last_row = page_rows[-1].as_py() if len(page_rows) else None
+    return page.select(columns), total_rows, last_row
+
+
+def _scan_query_cache() -> Tuple[List[dict], Dict[tuple, int]]:
+    """
+    按 uniqueId 汇总 files_cache 下的文件(结果文件及其附属文件)
+
+    Returns:
+        Tuple[List[dict], Dict[tuple, int]]: 条目列表(每个条目记录其文件的 inode)，以及 inode -> 文件大小；
+        内容键与 uniqueId 的结果通过硬链接共享同一个 inode，数据只占用一份空间
+    """
+    groups: Dict[str, dict] = {}
+    inode_sizes: Dict[tuple, int] = {}
+    try:
+        dir_entries = list(os.scandir(FILE_CACHE_PATH))
+    except FileNotFoundError:
+        return [], inode_sizes
+
+    for dir_entry in dir_entries:
+        # 查询标记在子目录中，由 collect_query_cache_garbage 单独清理
+        if not dir_entry.is_file():
+            continue
+        try:
+            stat = dir_entry.stat()
+        except FileNotFoundError:
+            continue
+        key = dir_entry.name.split(".", 1)[0]
+        group = groups.setdefault(
+            key, {"key": key, "paths": [], "inodes": set(), "mtime": 0.0, "atime": 0.0})
+        group["paths"].append(dir_entry.path)
+        inode = (stat.st_dev, stat.st_ino)
+        group["inodes"].add(inode)
+        inode_sizes[inode] = stat.st_size
+        group["mtime"] = max(group["mtime"], stat.st_mtime)
+        group["atime"] = max(group["atime"], stat.st_atime, stat.st_mtime)
+    return list(groups.values()), inode_sizes
+
+
+def get_query_cache_occupancy() -> dict:
+    """
+    files_cache 当前的占用情况
+
+    Returns:
+        dict: 条目数、总字节数及清理策略
+    """
+    groups, inode_sizes = _scan_query_cache()
+    return {
+        "entries": len(groups),
+        "bytes": sum(inode_sizes.values()),
+        "maxBytes": CACHE_MAX_BYTES,
+        "maxAgeSeconds": CACHE_MAX_AGE_SECONDS,
+        "protectSeconds": CACHE_PROTECT_SECONDS,
+    }
+
+
+def _remove_cache_group(group: dict):
+    for path in group["paths"]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    query_result_memory_cache.pop(group["key"])
+
+
+def _process_exists(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _remove_stale_query_markers(now: float, protect_seconds: int):
+    """
+    删除遗留的查询标记: 已退出进程的执行标记，以及超过保护期的取消标记
+    (进程异常退出时，或取消时查询恰好结束)
+    """
+    try:
+        dir_entries = list(os.scandir(Path(FILE_CACHE_PATH) / QUERY_MARKER_DIR))
+    except FileNotFoundError:
+        return
+    for dir_entry in dir_entries:
+        suffix = dir_entry.name.rpartition(".")[2]
+        try:
+            if suffix == "cancel":
+                stale = now - dir_entry.stat().st_mtime >= protect_seconds
+            else:
+                stale = suffix.isdigit() and not _process_exists(int(suffix))
+            if stale:
+                os.remove(dir_entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def collect_query_cache_garbage(max_bytes: int = CACHE_MAX_BYTES,
+                                max_age_seconds: int = CACHE_MAX_AGE_SECONDS,
+                                protect_seconds: int = CACHE_PROTECT_SECONDS) -> dict:
+    """
+    清理 files_cache: 先删除超过最长保留时间的条目，再按最久未访问优先删除，直到总大小不超过上限；
+    保护期内访问过的条目不会被删除
+
+    Args:
+        max_bytes (int): 总大小上限
+        max_age_seconds (int): 最长保留时间
+        protect_seconds (int): 最近访问保护期
+
+    Returns:
+        dict: 清理结果
+    """
+    now = time.time()
+    _remove_stale_query_markers(now, protect_seconds)
+    groups, inode_sizes = _scan_query_cache()
+    total_bytes = sum(inode_sizes.values())
+    # 每个 inode 被多少个条目引用；只有删除最后一个引用它的条目时才真正释放空间
+    inode_refs: Dict[tuple, int] = {}
+    for group in groups:
+        for inode in group["inodes"]:
+            inode_refs[inode] = inode_refs.get(inode, 0) + 1
+    removed = []
+    reclaimed_bytes = 0
+
+    candidates = sorted(
+        (group for group in groups if now - group["atime"] >= protect_seconds),
+        key=lambda group: group["atime"])
+    for group in candidates:
+        expired = now - group["mtime"] > max_age_seconds
+        if not expired and total_bytes <= max_bytes:
+            continue
+        _remove_cache_group(group)
+        removed.append(group)
+        for inode in group["inodes"]:
+            inode_refs[inode] -= 1
+            if inode_refs[inode] == 0:
+                reclaimed_bytes += inode_sizes[inode]
+                total_bytes -= inode_sizes[inode]
+
+    return {
+        "removedEntries": len(removed),
+        "reclaimedBytes": reclaimed_bytes,
+        "remainingEntries": len(groups) - len(removed),
+        "remainingBytes": total_bytes,
+    }
+
+
+async def run_cache_janitor():
+    """后台定期清理 files_cache"""
+    while True:
+        try:
+            report = await run_in_executor("cpu", collect_query_cache_garbage)
+            logger.debug("清理查询缓存: %s", report)
+        except Exception as e:
+            logger.exception("清理查询缓存时发生错误: %s", e)
+        await asyncio.sleep(CACHE_JANITOR_INTERVAL_SECONDS)
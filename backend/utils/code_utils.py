@@ -0,0 +1,113 @@
+import os
+import hashlib
+import linecache
+import threading
+import traceback
+from collections import OrderedDict
+from types import CodeType
+from typing import Tuple, Union
+
+# 编译结果缓存的条目数上限
+CODE_CACHE_SIZE = int(os.environ.get("DATAVIZ_CODE_CACHE_SIZE", 256))
+
+# 缓存的语法错误: (错误信息, (文件名, 行号, 列号, 出错的行, 结束行号, 结束列号))
+SyntaxErrorInfo = Tuple[str, tuple]
+
+
+class CompiledCodeCache:
+    """
+    按代码内容的哈希缓存编译后的代码对象(语法错误也一并缓存)，超出条目数时淘汰最久未使用的条目
+
+    代码以 "<类型-哈希>" 作为文件名登记到 linecache，traceback 中可以显示用户代码的行
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Union[CodeType, SyntaxErrorInfo]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, code: str, kind: str) -> CodeType:
+        """
+        编译用户代码
+
+        Args:
+            code (str): 代码
+            kind (str): 代码类型(artifact/python)，用于生成文件名
+
+        Returns:
+            CodeType: 代码对象
+
+        Raises:
+            SyntaxError: 代码有语法错误(含缓存的语法错误)
+        """
+        filename = f"<{kind}-{hashlib.sha256(code.encode('utf-8')).hexdigest()[:16]}>"
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is not None:
+                self._entries.move_to_end(filename)
+                self.hits += 1
+        if entry is None:
+            try:
+                entry = compile(code, filename, "exec")
+            except SyntaxError as e:
+                entry = (e.msg, (e.filename, e.lineno, e.offset,
+                         e.text, e.end_lineno, e.end_offset))
+            except ValueError as e:
+                # 代码中包含空字符
+                entry = (str(e), (filename, None, None, None, None, None))
+            self._put(filename, code, entry)
+        if isinstance(entry, tuple):
+            # 每次抛出新的异常，并发的调用方不会共享 traceback 与异常链
+            raise SyntaxError(*entry)
+        return entry
+
+    def _put(self, filename: str, code: str, entry: Union[CodeType, SyntaxErrorInfo]):
+        with self._lock:
+            self.misses += 1
+            self._entries[filename] = entry
+            self._entries.move_to_end(filename)
+            linecache.cache[filename] = (
+                len(code), None, code.splitlines(True), filename)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                linecache.cache.pop(evicted, None)
+
+    def __contains__(self, filename: str) -> bool:
+        with self._lock:
+            return filename in self._entries
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# 进程内共享的编译结果缓存(每个沙箱 worker 各自一份)
+compiled_code_cache = CompiledCodeCache(CODE_CACHE_SIZE)
+
+
+def compile_user_code(code: str, kind: str) -> CodeType:
+    """编译用户代码，相同的代码只编译一次"""
+    return compiled_code_cache.compile(code, kind)
+
+
+def format_user_traceback(error: BaseException) -> str:
+    """
+    只保留 traceback 中位于用户代码内的帧
+
+    Returns:
+        str: 格式化后的 traceback，用户代码之外出错(如语法错误)时只有异常信息
+    """
+    frames = [frame for frame in traceback.extract_tb(error.__traceback__)
+              if frame.filename in compiled_code_cache]
+    lines = traceback.format_list(frames)
+    if lines:
+        lines.insert(0, "Traceback (most recent call last):\n")
+    lines.extend(traceback.format_exception_only(type(error), error))
+    return "".join(lines)
@@ -0,0 +1,137 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from functools import partial
+from typing import Any, Callable, Dict
+
+# 各执行器的线程数: sql(数据库客户端)、python(python数据源)、artifact(artifact代码)、cpu(pandas计算)
+EXECUTOR_SIZES = {
+    "sql": int(os.environ.get("DATAVIZ_SQL_EXECUTOR_THREADS", 8)),
+    "python": int(os.environ.get("DATAVIZ_PYTHON_EXECUTOR_THREADS", 4)),
+    "artifact": int(os.environ.get("DATAVIZ_ARTIFACT_EXECUTOR_THREADS", 4)),
+    "cpu": int(os.environ.get("DATAVIZ_CPU_EXECUTOR_THREADS", os.cpu_count() or 4)),
+}
+
+
+class MonitoredExecutor:
+    """
+    固定大小的线程池，统计排队数与活跃线程数；超出线程数的任务排队等待，而不是新建线程
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"dataviz-{name}")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        # completed 只统计成功的任务，抛出异常的任务计入 failed
+        self.completed = 0
+        self.failed = 0
+
+    def _run(self, fn: Callable, *args, **kwargs):
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException:
+            with self._lock:
+                self.active -= 1
+                self.failed += 1
+            raise
+        with self._lock:
+            self.active -= 1
+            self.completed += 1
+        return result
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        with self._lock:
+            self.queued += 1
+        try:
+            future = self._executor.submit(self._run, fn, *args, **kwargs)
+        except BaseException:
+            with self._lock:
+                self.queued -= 1
+            raise
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future: Future):
+        # 开始执行前被取消的任务不会经过 _run
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "maxWorkers": self.max_workers,
+                "queued": self.queued,
+                "active": self.active,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+_executors: Dict[str, MonitoredExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def start_executors():
+    """应用启动时创建所有执行器"""
+    for name in EXECUTOR_SIZES:
+        get_executor(name)
+
+
+def get_executor(name: str) -> MonitoredExecutor:
+    """
+    获取指定名称的执行器，未启动时按配置创建
+
+    Args:
+        name (str): 执行器名称(sql/python/artifact/cpu)
+
+    Returns:
+        MonitoredExecutor: 执行器
+    """
+    executor = _executors.get(name)
+    if executor is not None:
+        return executor
+    if name not in EXECUTOR_SIZES:
+        raise ValueError(f"Unknown executor: {name}")
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            executor = MonitoredExecutor(name, EXECUTOR_SIZES[name])
+            _executors[name] = executor
+        return executor
+
+
+async def run_in_executor(name: str, fn: Callable, *args, **kwargs) -> Any:
+    """
+    在指定执行器中运行同步函数
+
+    Args:
+        name (str): 执行器名称(sql/python/artifact/cpu)
+        fn (Callable): 同步函数
+    """
+    future = get_executor(name).submit(partial(fn, *args, **kwargs))
+    return await asyncio.wrap_future(future)
+
+
+def executor_stats() -> Dict[str, dict]:
+    return {name: executor.stats() for name, executor in _executors.items()}
+
+
+def shutdown_executors(wait: bool = True):
+    """应用关闭时停止所有执行器"""
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=wait)
@@ -15,6 +15,8 @@ FS_DATA_FILE = os.path.join(DATA_DIR, "fs_items.json")
 FILE_STORAGE_PATH = os.path.join(DATA_DIR, "files")
 FILE_DELETED_PATH = os.path.join(DATA_DIR, "files_deleted")
 FILE_CACHE_PATH = os.path.join(DATA_DIR, "files_cache")
+# files_cache 下存放正在执行的查询与取消请求标记的子目录
+QUERY_MARKER_DIR = "running"
 FILE_TOKEN_PATH = os.path.join(DATA_DIR, "tokens")
 
 # 创建一个全局的文件系统数据锁
@@ -0,0 +1,326 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from fastapi import Request
+from models.report_models import DataSource, AutoUpdateMode
+from utils.fs_utils import FILE_CACHE_PATH, QUERY_MARKER_DIR
+from utils.code_utils import compile_user_code
+
+# 手动更新的数据源，复用查询结果的默认有效期(秒)
+QUERY_REUSE_DEFAULT_TTL = int(os.environ.get(
+    "DATAVIZ_QUERY_REUSE_DEFAULT_TTL", 600))
+
+# 查询结果的默认行数上限，可在引擎配置(maxRows)或数据源配置(config.maxRows)中覆盖
+QUERY_MAX_ROWS = int(os.environ.get("DATAVIZ_QUERY_MAX_ROWS", 500000))
+
+# 检查客户端断开与取消请求的间隔(秒)
+QUERY_CANCEL_POLL_INTERVAL = float(os.environ.get(
+    "DATAVIZ_QUERY_CANCEL_POLL_INTERVAL", 0.5))
+
+# 正在执行的查询: 内容键 -> 执行任务
+_inflight_queries: Dict[str, asyncio.Task] = {}
+# 每个执行任务的等待者数量
+_inflight_waiters: Dict[asyncio.Task, int] = {}
+# 正在执行查询的请求: uniqueId -> (内容键, 请求任务)
+_running_requests: Dict[str, tuple] = {}
+
+
+class QueryCancelledError(Exception):
+    pass
+
+
+def normalize_code(code: str) -> str:
+    """
+    规范化代码，仅去掉不影响语义的空白(首尾空行、行尾空格、换行符差异)
+
+    Args:
+        code (str): 解析后的代码
+
+    Returns:
+        str: 规范化后的代码
+    """
+    lines = code.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def compute_content_key(request_type: str, engine: Optional[str], code: str,
+                        inputs: Optional[Dict[str, Any]] = None) -> str:
+    """
+    根据数据源类型、引擎和解析后的代码计算内容键，相同内容的查询共享结果
+
+    Args:
+        request_type (str): 数据源类型(sql/python)
+        engine (Optional[str]): 执行引擎
+        code (str): 解析后的代码
+        inputs (Optional[Dict[str, Any]]): 查询依赖的其他查询结果(别名 -> 结果版本)，依赖变化后不再复用
+
+    Returns:
+        str: 内容键，可直接作为缓存文件名
+    """
+    digest = hashlib.sha256()
+    parts = [request_type, engine or "", normalize_code(code)]
+    if inputs:
+        parts.append(json.dumps(inputs, sort_keys=True))
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return "cas_" + digest.hexdigest()
+
+
+def get_reuse_ttl(data_source: DataSource) -> int:
+    """
+    查询结果的有效期：自动更新的数据源使用其更新间隔，否则使用默认值
+
+    Args:
+        data_source (DataSource): 数据源
+
+    Returns:
+        int: 有效期(秒)
+    """
+    executor = data_source.executor
+    update_mode = getattr(executor, "updateMode", None)
+    if isinstance(update_mode, AutoUpdateMode) and update_mode.interval is not None:
+        return update_mode.interval
+    return QUERY_REUSE_DEFAULT_TTL
+
+
+def get_max_rows(data_source: DataSource, engine_max_rows: Optional[int] = None) -> int:
+    """
+    查询结果的行数上限：数据源配置优先，其次为引擎配置，否则使用默认值
+
+    Args:
+        data_source (DataSource): 数据源
+        engine_max_rows (Optional[int]): 引擎配置的行数上限
+
+    Returns:
+        int: 行数上限
+    """
+    max_rows = (data_source.config or {}).get("maxRows")
+    if max_rows is not None:
+        return int(max_rows)
+    if engine_max_rows is not None:
+        return engine_max_rows
+    return QUERY_MAX_ROWS
+
+
+def execute_python_source(code: str) -> Any:
+    """
+    执行 python 数据源的代码，返回其中的 result 变量(在沙箱 worker 中运行)
+
+    Args:
+        code (str): 解析后的代码
+
+    Returns:
+        Any: result 变量的值
+    """
+    global_vars = {}
+    exec(compile_user_code(code, "python"), global_vars)
+    return global_vars.get('result')
+
+
+def _on_inflight_done(key: str, task: asyncio.Task):
+    if _inflight_queries.get(key) is task:
+        del _inflight_queries[key]
+    # 所有等待者都已离开时，避免 "exception was never retrieved" 警告
+    if not task.cancelled():
+        task.exception()
+
+
+async def run_single_flight(key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    相同内容键的查询同一时刻只执行一次，后到的请求等待第一次执行的结果；
+    执行出错时，所有等待者都会收到同一个异常
+
+    Args:
+        key (str): 内容键
+        func (Callable[[], Awaitable[Any]]): 执行查询的协程函数
+
+    Returns:
+        Any: 查询结果
+    """
+    task = _inflight_queries.get(key)
+    if task is None:
+        task = asyncio.ensure_future(func())
+        _inflight_queries[key] = task
+        task.add_done_callback(lambda t: _on_inflight_done(key, t))
+    _inflight_waiters[task] = _inflight_waiters.get(task, 0) + 1
+    try:
+        # 某个等待者被取消时，不影响其他等待者
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        # 最后一个等待者离开时，取消执行(由引擎终止服务端的查询)
+        if not task.done() and _inflight_waiters.get(task) == 1:
+            task.cancel()
+        raise
+    finally:
+        _inflight_waiters[task] -= 1
+        if _inflight_waiters[task] == 0:
+            del _inflight_waiters[task]
+
+
+def validate_unique_id(uniqueId: str):
+    """
+    检查 uniqueId 能否安全地用作 files_cache 下的文件名
+
+    Raises:
+        ValueError: uniqueId 为空，或包含路径分隔符、".."
+    """
+    if not uniqueId or "/" in uniqueId or "\\" in uniqueId or ".." in uniqueId:
+        raise ValueError(f"Invalid uniqueId: {uniqueId!r}")
+
+
+def _marker_dir() -> Path:
+    return Path(FILE_CACHE_PATH) / QUERY_MARKER_DIR
+
+
+def _running_marker_path(uniqueId: str) -> Path:
+    """
+    当前进程正在执行 uniqueId 的查询的标记(内容为内容键)，
+    让其他 worker 进程知道该查询正在执行，以及同一 uniqueId 上是否发起了新的查询
+    """
+    validate_unique_id(uniqueId)
+    return _marker_dir() / f"{uniqueId}.{os.getpid()}"
+
+
+def _cancel_marker_path(uniqueId: str) -> Path:
+    """取消标记文件，让其他 worker 进程中同一 uniqueId 的查询也能被取消"""
+    validate_unique_id(uniqueId)
+    return _marker_dir() / f"{uniqueId}.cancel"
+
+
+def _write_marker(marker: Path, content: str):
+    marker.parent.mkdir(parents=True, exist_ok=True)
+    marker.write_text(content)
+    now = time.time_ns()
+    os.utime(marker, ns=(now, now))
+
+
+def _remove_marker(marker: Path):
+    try:
+        os.remove(marker)
+    except FileNotFoundError:
+        pass
+
+
+def _other_running_markers(uniqueId: str) -> List[Tuple[Path, int]]:
+    """其他进程中 uniqueId 正在执行的查询的标记(路径, 写入时间)"""
+    validate_unique_id(uniqueId)
+    markers = []
+    try:
+        dir_entries = list(os.scandir(_marker_dir()))
+    except FileNotFoundError:
+        return markers
+    for dir_entry in dir_entries:
+        name, _, pid = dir_entry.name.rpartition(".")
+        if name != uniqueId or not pid.isdigit() or int(pid) == os.getpid():
+            continue
+        try:
+            markers.append((Path(dir_entry.path), dir_entry.stat().st_mtime_ns))
+        except FileNotFoundError:
+            pass
+    return markers
+
+
+def _check_cancel_markers(uniqueId: str, content_key: str, since: int) -> Optional[str]:
+    """
+    检查 since 之后其他进程对 uniqueId 的取消请求或内容不同的新查询
+
+    Returns:
+        Optional[str]: 需要取消时返回原因
+    """
+    try:
+        if _cancel_marker_path(uniqueId).stat().st_mtime_ns > since:
+            return "[Query] 查询已取消"
+    except FileNotFoundError:
+        pass
+    for marker, mtime in _other_running_markers(uniqueId):
+        if mtime <= since:
+            continue
+        try:
+            if marker.read_text() != content_key:
+                return "[Query] 已有新的查询，当前查询已取消"
+        except FileNotFoundError:
+            pass
+    return None
+
+
+def request_query_cancel(uniqueId: str) -> int:
+    """
+    取消 uniqueId 正在执行的查询(包括其他 worker 进程中的查询)
+
+    Args:
+        uniqueId (str): 查询结果ID
+
+    Returns:
+        int: 当前进程中被取消的查询数
+
+    Raises:
+        ValueError: uniqueId 不合法
+    """
+    # 只有其他进程正在执行时才写入取消标记，没有查询在执行时不做任何操作
+    if _other_running_markers(uniqueId):
+        _write_marker(_cancel_marker_path(uniqueId), "")
+    running = _running_requests.get(uniqueId)
+    if running is not None and not running[1].done():
+        running[1].cancel()
+        return 1
+    return 0
+
+
+async def run_cancellable(uniqueId: str, content_key: Optional[str], http_request: Optional[Request],
+                          coro: Awaitable[Any]) -> Any:
+    """
+    执行查询，在以下情况下取消执行:
+    - 客户端断开连接
+    - 调用了取消接口
+    - 同一 uniqueId 发起了内容不同的新查询(如修改了参数后重新查询)
+
+    Args:
+        uniqueId (str): 查询结果ID
+        content_key (Optional[str]): 查询的内容键
+        http_request (Optional[Request]): 用于检测客户端是否断开
+        coro (Awaitable[Any]): 执行查询的协程
+
+    Returns:
+        Any: 查询结果
+    """
+    content_key = content_key or ""
+    # 替换同一 uniqueId 上内容不同的旧查询
+    running = _running_requests.get(uniqueId)
+    if running is not None and running[0] != content_key and not running[1].done():
+        running[1].cancel()
+    running_marker = _running_marker_path(uniqueId)
+    _write_marker(running_marker, content_key)
+    started = time.time_ns()
+
+    task = asyncio.ensure_future(coro)
+    _running_requests[uniqueId] = (content_key, task)
+    try:
+        while True:
+            await asyncio.wait({task}, timeout=QUERY_CANCEL_POLL_INTERVAL)
+            if task.done():
+                if task.cancelled():
+                    raise QueryCancelledError("[Query] 查询已取消")
+                return task.result()
+
+            if http_request is not None and await http_request.is_disconnected():
+                reason = "[Query] 客户端已断开，查询已取消"
+            else:
+                reason = _check_cancel_markers(uniqueId, content_key, started)
+                if reason is None:
+                    continue
+            task.cancel()
+            raise QueryCancelledError(reason)
+    finally:
+        if not task.done():
+            task.cancel()
+        if _running_requests.get(uniqueId, (None, None))[1] is task:
+            del _running_requests[uniqueId]
+            _remove_marker(running_marker)
+            # 最后一个执行该查询的进程删除取消标记
+            if not _other_running_markers(uniqueId):
+                _remove_marker(_cancel_marker_path(uniqueId))
@@ -0,0 +1,515 @@
+import os
+import math
+import pickle
+import signal
+import logging
+import asyncio
+import resource
+import threading
+import multiprocessing
+from collections import OrderedDict
+from multiprocessing.reduction import ForkingPickler
+from typing import Any, Callable, List, Optional, Union
+
+from models.engine_models import ExecutionLimits
+from utils.executor_utils import run_in_executor
+
+logger = logging.getLogger(__name__)
+
+# 沙箱 worker 进程数，0 表示在当前进程的执行器线程中运行用户代码
+SANDBOX_WORKERS = int(os.environ.get("DATAVIZ_SANDBOX_WORKERS", 4))
+# worker 启动前预先导入的模块(逗号分隔)，不存在的模块会被忽略
+SANDBOX_PRELOAD_MODULES = [name.strip() for name in os.environ.get(
+    "DATAVIZ_SANDBOX_PRELOAD_MODULES",
+    "numpy,pandas,pyarrow,plotly.graph_objects,plotly.express,matplotlib.pyplot,pyecharts.charts,altair",
+).split(",") if name.strip()]
+# 每个 worker 记住最近执行过的亲和键(如 artifact 依赖的查询结果)的个数，
+# 相同亲和键的任务优先交给同一个 worker，复用其进程内缓存
+SANDBOX_AFFINITY_KEYS = int(os.environ.get("DATAVIZ_SANDBOX_AFFINITY_KEYS", 64))
+# 每个 worker 最多执行的任务数，之后换成新的 worker
+SANDBOX_MAX_TASKS = int(os.environ.get("DATAVIZ_SANDBOX_MAX_TASKS", 200))
+# worker 的常驻内存超过该值(MB)后换成新的 worker
+SANDBOX_MAX_RSS_MB = int(os.environ.get("DATAVIZ_SANDBOX_MAX_RSS_MB", 2048))
+# worker 进程内 DataFrame 缓存的内存上限(字节)
+SANDBOX_DF_CACHE_MAX_BYTES = int(os.environ.get(
+    "DATAVIZ_SANDBOX_DF_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# 启用沙箱时主进程 DataFrame 缓存的内存上限(字节): artifact 在 worker 中加载数据，
+# 主进程只在复用查询结果、生成 artifact 代码等场景读取结果
+SANDBOX_MAIN_DF_CACHE_MAX_BYTES = int(os.environ.get(
+    "DATAVIZ_SANDBOX_MAIN_DF_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+
+# 用户代码单次执行的默认资源限制，0 表示不限制
+SANDBOX_MEMORY_MB = float(os.environ.get("DATAVIZ_SANDBOX_MEMORY_MB", 4096))
+SANDBOX_CPU_SECONDS = float(os.environ.get("DATAVIZ_SANDBOX_CPU_SECONDS", 300))
+SANDBOX_WALL_SECONDS = float(os.environ.get("DATAVIZ_SANDBOX_WALL_SECONDS", 600))
+SANDBOX_OUTPUT_MB = float(os.environ.get("DATAVIZ_SANDBOX_OUTPUT_MB", 256))
+
+_MB = 1024 * 1024
+
+
+class SandboxWorkerError(Exception):
+    """worker 进程异常退出(被终止或崩溃)"""
+    pass
+
+
+class SandboxLimitError(Exception):
+    """用户代码超出资源限制"""
+
+    MESSAGES = {
+        "memory": "内存超过限制({value:g} MB)",
+        "cpu": "CPU 时间超过限制({value:g} 秒)",
+        "wall": "执行超时(限制 {value:g} 秒)",
+        "output": "返回结果超过限制({value:g} MB)",
+    }
+
+    def __init__(self, limit: str, value: float):
+        super().__init__(self.MESSAGES[limit].format(value=value))
+        self.limit = limit
+        self.value = value
+
+    def __reduce__(self):
+        return (SandboxLimitError, (self.limit, self.value))
+
+
+def resolve_execution_limits(*overrides: Union[ExecutionLimits, dict, None]) -> ExecutionLimits:
+    """
+    合并资源限制: 以默认值为基础，后面的配置覆盖前面的配置中已设置的项
+
+    Args:
+        overrides (Union[ExecutionLimits, dict, None]): 按优先级从低到高排列的配置
+
+    Returns:
+        ExecutionLimits: 合并后的资源限制
+    """
+    limits = ExecutionLimits(memoryMb=SANDBOX_MEMORY_MB, cpuSeconds=SANDBOX_CPU_SECONDS,
+                             wallSeconds=SANDBOX_WALL_SECONDS, outputMb=SANDBOX_OUTPUT_MB)
+    for override in overrides:
+        if override is None:
+            continue
+        if isinstance(override, dict):
+            override = ExecutionLimits(**override)
+        limits = limits.copy(update=override.dict(exclude_none=True))
+    return limits
+
+
+def _current_rss() -> int:
+    """当前进程的常驻内存(字节)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # 非 Linux 平台退回峰值内存
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _current_vms() -> Optional[int]:
+    """当前进程的虚拟内存大小(字节)，RLIMIT_AS 以此为基准"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# worker 中正在执行的任务的资源限制，SIGXCPU 的处理函数据此抛出异常
+_active_limits: Optional[ExecutionLimits] = None
+
+
+def _on_cpu_limit(signum, frame):
+    # 超出软限制后内核每秒发送一次 SIGXCPU，任务结束后恢复限制即不再触发
+    if _active_limits is not None and _active_limits.cpuSeconds:
+        raise SandboxLimitError("cpu", _active_limits.cpuSeconds)
+
+
+def _apply_limits(limits: Optional[ExecutionLimits]) -> Callable[[], None]:
+    """
+    为本次任务设置 rlimit(只修改软限制，任务结束后可以恢复)
+
+    Returns:
+        Callable[[], None]: 恢复原来限制的函数
+    """
+    global _active_limits
+    restores = []
+    if limits is not None and limits.memoryMb:
+        vms = _current_vms()
+        if vms is not None:
+            soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+            target = vms + int(limits.memoryMb * _MB)
+            if hard != resource.RLIM_INFINITY:
+                target = min(target, hard)
+            resource.setrlimit(resource.RLIMIT_AS, (target, hard))
+            restores.append(lambda: resource.setrlimit(
+                resource.RLIMIT_AS, (soft, hard)))
+    if limits is not None and limits.cpuSeconds:
+        # RLIMIT_CPU 是进程累计的 CPU 时间，在已用时间的基础上计算
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        target = int(math.ceil(usage.ru_utime +
+                     usage.ru_stime + limits.cpuSeconds))
+        if hard != resource.RLIM_INFINITY:
+            target = min(target, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (target, hard))
+        restores.append(lambda: resource.setrlimit(
+            resource.RLIMIT_CPU, (soft, hard)))
+    _active_limits = limits
+
+    def restore():
+        global _active_limits
+        _active_limits = None
+        while restores:
+            restores.pop()()
+    return restore
+
+
+def _preload(modules: List[str]):
+    """导入常用的重型库，并初始化 matplotlib 的 Agg 后端(含字体缓存)"""
+    for name in modules:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.font_manager  # noqa: F401
+    except ImportError:
+        pass
+
+
+def _picklable_exception(error: BaseException) -> Exception:
+    """用户代码抛出的异常可能无法序列化(如代码中定义的异常类)，此时只保留错误信息"""
+    if not isinstance(error, Exception):
+        return RuntimeError(f"{type(error).__name__}: {error}")
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        return RuntimeError(str(error))
+
+
+def _worker_main(conn, modules: List[str]):
+    """worker 进程: 预加载模块后循环执行任务，结果与当前内存占用一并返回"""
+    _preload(modules)
+    # 每个 worker 都有自己的 DataFrame 缓存，缩小预算避免内存成倍增长
+    from utils.cache_utils import query_result_memory_cache
+    query_result_memory_cache.resize(SANDBOX_DF_CACHE_MAX_BYTES)
+    signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    conn.send(("ready", None, _current_rss()))
+    while True:
+        try:
+            fn, args, kwargs, limits = conn.recv()
+        except (EOFError, OSError):
+            break
+        restore = _apply_limits(limits)
+        try:
+            try:
+                reply = ("ok", fn(*args, **kwargs))
+            finally:
+                restore()
+        except MemoryError as e:
+            reply = ("error", SandboxLimitError("memory", limits.memoryMb)
+                     if limits is not None and limits.memoryMb else _picklable_exception(e))
+        except BaseException as e:
+            reply = ("error", _picklable_exception(e))
+        # 恢复限制前恰好收到 SIGXCPU 时，上面的 restore 没有执行完
+        restore()
+        try:
+            data = ForkingPickler.dumps(reply + (_current_rss(),))
+            if limits is not None and limits.outputMb and len(data) > limits.outputMb * _MB:
+                data = ForkingPickler.dumps(
+                    ("error", SandboxLimitError("output", limits.outputMb), _current_rss()))
+        except Exception as e:
+            data = ForkingPickler.dumps(("error", RuntimeError(
+                f"无法返回执行结果: {e}"), _current_rss()))
+        del reply
+        conn.send_bytes(data)
+
+
+class SandboxWorker:
+    def __init__(self, ctx, modules: List[str]):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child_conn, modules), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+        self.rss = 0
+        self.dead = False
+        # 最近执行过的亲和键
+        self.affinity: "OrderedDict[str, None]" = OrderedDict()
+        # 任务超出资源限制后，worker 的状态不可信，用完即换
+        self.retire = False
+
+    def remember(self, key: str):
+        self.affinity[key] = None
+        self.affinity.move_to_end(key)
+        while len(self.affinity) > SANDBOX_AFFINITY_KEYS:
+            self.affinity.popitem(last=False)
+
+    def wait_ready(self):
+        try:
+            _, _, self.rss = self.conn.recv()
+        except (EOFError, OSError):
+            self.dead = True
+            raise SandboxWorkerError("沙箱进程启动失败")
+
+    def kill(self):
+        """终止 worker 进程，正在等待结果的线程会收到 SandboxWorkerError"""
+        self.dead = True
+        if self.process.is_alive():
+            self.process.kill()
+
+    def close(self):
+        # 空闲的 worker 在连接关闭后自行退出，忙碌或无响应的 worker 直接终止
+        self.conn.close()
+        self.process.join(timeout=0 if self.dead else 1)
+        self.kill()
+        self.process.join(timeout=5)
+
+
+class SandboxPool:
+    """
+    预先启动的 Python 执行进程池: worker 从预加载了常用库的 forkserver 派生，
+    执行用户代码时无需再付出导入成本；执行次数或内存超过上限的 worker 会被替换，
+    用户代码的内存泄漏不会累积
+
+    每个 worker 有自己的 DataFrame 缓存、过滤索引与编译缓存；带亲和键的任务优先交给
+    最近执行过同一亲和键的空闲 worker，重复执行的 artifact 可以命中这些缓存
+    """
+
+    def __init__(self, size: int, modules: List[str], max_tasks: int, max_rss_mb: int):
+        self.size = size
+        self.modules = modules
+        self.max_tasks = max_tasks
+        self.max_rss = max_rss_mb * 1024 * 1024
+        self._ctx = None
+        self._idle: List[SandboxWorker] = []
+        self._workers: List[SandboxWorker] = []
+        self._lock = threading.Lock()
+        self._idle_changed = threading.Condition(self._lock)
+        self._closed = False
+        self.executed = 0
+        self.recycled = 0
+        self.killed = 0
+        self.affinity_hits = 0
+
+    def start(self):
+        """启动 forkserver 与全部 worker，等待其预加载完成"""
+        with self._lock:
+            if self._ctx is not None:
+                return
+            # forkserver 预先导入重型库，之后派生的 worker 直接继承
+            os.environ.setdefault("MPLBACKEND", "Agg")
+            self._ctx = multiprocessing.get_context("forkserver")
+            self._ctx.set_forkserver_preload(self.modules)
+            self._closed = False
+        workers = [self._spawn() for _ in range(self.size)]
+        for worker in workers:
+            self._ready(worker)
+
+    def _spawn(self) -> SandboxWorker:
+        worker = SandboxWorker(self._ctx, self.modules)
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+
+    def _ready(self, worker: SandboxWorker):
+        try:
+            worker.wait_ready()
+        except SandboxWorkerError as e:
+            logger.warning("%s: %s", e, worker.process.exitcode)
+            self._discard(worker)
+            return
+        self._put_idle(worker)
+
+    def _put_idle(self, worker: SandboxWorker):
+        with self._idle_changed:
+            self._idle.append(worker)
+            self._idle_changed.notify()
+
+    def _take_idle(self, affinity: Optional[str]) -> Optional[SandboxWorker]:
+        """取出空闲的 worker，优先选择执行过该亲和键的 worker；调用方持有锁"""
+        if not self._idle:
+            return None
+        if affinity is not None:
+            for index, worker in enumerate(self._idle):
+                if affinity in worker.affinity:
+                    self.affinity_hits += 1
+                    return self._idle.pop(index)
+        return self._idle.pop(0)
+
+    def _replace(self, worker: Optional[SandboxWorker] = None):
+        if worker is not None:
+            self._discard(worker)
+        if not self._closed:
+            self._ready(self._spawn())
+
+    def _discard(self, worker: SandboxWorker):
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+        worker.close()
+
+    def _acquire(self, affinity: Optional[str] = None) -> SandboxWorker:
+        while True:
+            with self._idle_changed:
+                worker = self._take_idle(affinity)
+                if worker is None:
+                    self._idle_changed.wait(timeout=1)
+                    worker = self._take_idle(affinity)
+                if worker is not None:
+                    return worker
+                starved = not self._workers
+            if self._closed:
+                raise SandboxWorkerError("沙箱进程池已关闭")
+            # 所有 worker 都启动失败时重试一次，仍然失败则返回错误而不是一直等待
+            if starved:
+                self._replace()
+                with self._lock:
+                    if not self._idle:
+                        raise SandboxWorkerError("沙箱进程启动失败")
+
+    def _release(self, worker: SandboxWorker):
+        if self._closed:
+            self._discard(worker)
+            return
+        if worker.dead:
+            self.killed += 1
+        elif worker.retire or worker.tasks >= self.max_tasks or worker.rss > self.max_rss:
+            self.recycled += 1
+        else:
+            self._put_idle(worker)
+            return
+        # 在后台回收并补充新的 worker，不阻塞当前请求
+        threading.Thread(target=self._replace, args=(worker,), daemon=True).start()
+
+    def run(self, fn: Callable, args: tuple = (), kwargs: Optional[dict] = None,
+            limits: Optional[ExecutionLimits] = None, handle: Optional[dict] = None,
+            affinity: Optional[str] = None) -> Any:
+        """
+        在空闲的 worker 中执行函数(同步等待)；fn 及其参数、返回值需要能被 pickle
+
+        Args:
+            fn (Callable): 模块级函数
+            args (tuple): 位置参数
+            kwargs (Optional[dict]): 关键字参数
+            limits (Optional[ExecutionLimits]): 资源限制，超出墙钟时间后终止 worker
+            handle (Optional[dict]): 用于记录执行任务的 worker，以便取消时终止
+            affinity (Optional[str]): 亲和键，优先交给执行过相同亲和键的 worker
+
+        Returns:
+            Any: 函数的返回值
+
+        Raises:
+            SandboxLimitError: 超出资源限制
+        """
+        timeout = (limits.wallSeconds or None) if limits is not None else None
+        if self._ctx is None:
+            self.start()
+        worker = self._acquire(affinity)
+        if affinity is not None:
+            worker.remember(affinity)
+        try:
+            if handle is not None:
+                handle["worker"] = worker
+            try:
+                worker.conn.send((fn, args, kwargs or {}, limits))
+                finished = worker.conn.poll(timeout)
+                if finished:
+                    status, payload, worker.rss = worker.conn.recv()
+            except (EOFError, OSError):
+                worker.dead = True
+                worker.process.join(timeout=1)
+                raise SandboxWorkerError(
+                    f"沙箱进程异常退出(exitcode={worker.process.exitcode})")
+            if not finished:
+                worker.kill()
+                raise SandboxLimitError("wall", timeout)
+            worker.tasks += 1
+            self.executed += 1
+            if status == "error":
+                if isinstance(payload, SandboxLimitError):
+                    worker.retire = True
+                raise payload
+            return payload
+        finally:
+            self._release(worker)
+
+    def stats(self) -> dict:
+        with self._lock:
+            workers = list(self._workers)
+        return {
+            "size": self.size,
+            "workers": len(workers),
+            "idle": len(self._idle),
+            "executed": self.executed,
+            "affinityHits": self.affinity_hits,
+            "recycled": self.recycled,
+            "killed": self.killed,
+            "rss": [worker.rss for worker in workers],
+        }
+
+    def shutdown(self):
+        """终止所有 worker"""
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.close()
+        with self._idle_changed:
+            self._idle.clear()
+            self._idle_changed.notify_all()
+            self._ctx = None
+
+
+# 进程共享的沙箱进程池
+sandbox_pool = SandboxPool(SANDBOX_WORKERS, SANDBOX_PRELOAD_MODULES,
+                           SANDBOX_MAX_TASKS, SANDBOX_MAX_RSS_MB)
+
+
+def start_sandbox():
+    """应用启动时预先启动沙箱 worker，并缩小主进程的 DataFrame 缓存(不再写穿)"""
+    if SANDBOX_WORKERS > 0:
+        from utils.cache_utils import query_result_memory_cache
+        query_result_memory_cache.write_through = False
+        query_result_memory_cache.resize(
+            min(query_result_memory_cache.max_bytes, SANDBOX_MAIN_DF_CACHE_MAX_BYTES))
+        sandbox_pool.start()
+
+
+def shutdown_sandbox():
+    if SANDBOX_WORKERS > 0:
+        sandbox_pool.shutdown()
+
+
+async def run_in_sandbox(executor: str, fn: Callable, *args, limits: Optional[ExecutionLimits] = None,
+                         affinity: Optional[str] = None, **kwargs) -> Any:
+    """
+    在沙箱 worker 中执行用户代码，由指定执行器的线程等待结果；
+    请求被取消(超时或客户端断开)时终止对应的 worker
+
+    Args:
+        executor (str): 等待结果的执行器名称(python/artifact)
+        fn (Callable): 模块级函数
+        limits (Optional[ExecutionLimits]): 资源限制；在当前进程中执行时只有墙钟时间生效
+        affinity (Optional[str]): 亲和键，相同亲和键的任务优先在同一个 worker 中执行
+
+    Raises:
+        SandboxLimitError: 超出资源限制
+    """
+    if SANDBOX_WORKERS <= 0:
+        timeout = (limits.wallSeconds or None) if limits is not None else None
+        try:
+            return await asyncio.wait_for(run_in_executor(executor, fn, *args, **kwargs), timeout)
+        except asyncio.TimeoutError:
+            raise SandboxLimitError("wall", timeout)
+
+    handle = {}
+    try:
+        return await run_in_executor(executor, sandbox_pool.run, fn, args, kwargs, limits, handle, affinity)
+    except asyncio.CancelledError:
+        worker = handle.get("worker")
+        if worker is not None:
+            worker.kill()
+        raise
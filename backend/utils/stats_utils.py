@@ -0,0 +1,116 @@
+import os
+import json
+import math
+from datetime import date, datetime
+from typing import Any, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# 每列保存的高频值个数
+STATS_TOP_K = int(os.environ.get("DATAVIZ_STATS_TOP_K", 10))
+# 不同值个数不超过该值的列(低基数列)，按首次出现的顺序保存全部不同值
+STATS_LOW_CARDINALITY = int(os.environ.get(
+    "DATAVIZ_STATS_LOW_CARDINALITY", 10000))
+
+
+def _to_json_value(value: Any) -> Any:
+    """将 numpy/pandas 标量转换为可 json 序列化的值"""
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        return None
+    if isinstance(value, (pd.Timestamp, datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def _column_min_max(series: pd.Series) -> tuple:
+    non_null = series.dropna()
+    if non_null.empty:
+        return None, None
+    if series.dtype == object:
+        # 只对全部为字符串的列计算字典序的最值
+        if not non_null.map(lambda value: isinstance(value, str)).all():
+            return None, None
+    try:
+        return _to_json_value(non_null.min()), _to_json_value(non_null.max())
+    except TypeError:
+        return None, None
+
+
+def compute_column_stats(series: pd.Series) -> dict:
+    """
+    计算单列的统计信息
+
+    Args:
+        series (pd.Series): 列数据
+
+    Returns:
+        dict: dtype、空值数、不同值个数、最值、高频值，低基数列还包括全部不同值(字符串形式，按首次出现的顺序)
+    """
+    nulls = int(series.isna().sum())
+    stats = {
+        "dtype": str(series.dtype),
+        "count": int(len(series) - nulls),
+        "nulls": nulls,
+    }
+    try:
+        value_counts = series.value_counts(dropna=False)
+    except TypeError:
+        # 列中包含不可哈希的值(如 list/dict)，只保留基础信息
+        return stats
+
+    stats["distinct"] = int(len(value_counts) - (1 if nulls else 0))
+    stats["min"], stats["max"] = _column_min_max(series)
+    stats["topK"] = [
+        {"value": str(value), "count": int(count)}
+        for value, count in value_counts.head(STATS_TOP_K).items()
+    ]
+    # 与直接扫描数据时的 astype(str).unique() 一致: None -> 'None'，NaN -> 'nan'，保持首次出现的顺序
+    if len(value_counts) <= STATS_LOW_CARDINALITY:
+        stats["values"] = series.astype(str).unique().tolist()
+    else:
+        stats["values"] = None
+    return stats
+
+
+def compute_query_stats(df: pd.DataFrame) -> dict:
+    """
+    计算查询结果的统计信息，随查询结果一起保存
+
+    Args:
+        df (pd.DataFrame): 查询结果
+
+    Returns:
+        dict: 行数、每列的统计信息，以及 cascader 组合的缓存
+    """
+    return {
+        "rowCount": int(len(df)),
+        "columns": {str(column): compute_column_stats(df[column]) for column in df.columns},
+        "cascaders": {},
+    }
+
+
+def get_cascader_key(columns: List[str]) -> str:
+    """cascader 组合在统计信息中的键"""
+    return json.dumps(columns, ensure_ascii=False)
+
+
+def get_inferred_values(stats: Optional[dict], column: str) -> Optional[List[str]]:
+    """
+    从统计信息中取出某列的全部不同值
+
+    Returns:
+        Optional[List[str]]: 不同值列表；没有统计信息或列为高基数列时返回 None
+    """
+    if not stats:
+        return None
+    column_stats = stats["columns"].get(column)
+    if column_stats is None:
+        return None
+    return column_stats.get("values")
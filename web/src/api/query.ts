@@ -9,6 +9,12 @@ export const queryApi = {
     return response.data;
   },
 
+  // 取消正在执行的查询
+  async cancelQuery(uniqueId: string): Promise<{ cancelled: number }> {
+    const { data } = await axiosInstance.post(`/query/cancel/${uniqueId}`);
+    return data;
+  },
+
   // 根据查询哈希获取缓存的查询结果
   async getQueryResultByHash(
     queryHash: string,
@@ -44,6 +44,9 @@ import { DateRangePicker } from '@/components/ui/daterangepicker';
 
 import { useDataSourceDialogStore } from '@/lib/store/useDataSourceDialogStore';
 
+// 在已执行的数据源结果上执行 SQL 的引擎(见 backend/engines.example.json)
+const RESULTS_ENGINE = 'results';
+
 interface ParameterQueryAreaProps {
   activeTabId: string;
   reportId: string;
@@ -214,7 +217,8 @@ export const ParameterQueryArea = memo(
     };
 
     // 修改handleQuerySubmit函数，接收文件参数为对象
-    const handleQuerySubmit = async () => {
+    // forceRefresh: 忽略后端可复用的缓存结果，重新执行查询
+    const handleQuerySubmit = async (forceRefresh: boolean = false) => {
       if (dataSources && dataSources.length > 0) {
         setCachedValues(values);
         setCachedFiles(files);
@@ -229,21 +233,35 @@ export const ParameterQueryArea = memo(
           setQueryStatus(dataSource.id, newStatus);
         });
 
-        // 发起query请求
-        const promises = dataSources.map((dataSource) => {
-          return handleQueryRequest(dataSource);
-        });
+        // 发起query请求; results 引擎的查询引用其他数据源的结果，等其他数据源查询完成后再执行
+        const isResultsQuery = (dataSource: DataSource) =>
+          dataSource.executor.type === 'sql' &&
+          dataSource.executor.engine === RESULTS_ENGINE;
+        const promises = dataSources
+          .filter((dataSource) => !isResultsQuery(dataSource))
+          .map((dataSource) => {
+            return handleQueryRequest(dataSource, forceRefresh);
+          });
         // 过滤掉 null，并等待请求结果
         await Promise.all(promises.filter((promise) => promise !== null));
+        await Promise.all(
+          dataSources
+            .filter(isResultsQuery)
+            .map((dataSource) => handleQueryRequest(dataSource, forceRefresh))
+        );
         setIsQuerying(false);
       }
     };
 
+    // sessionId + tabId + dataSourceId (标识此处请求是唯一的)
+    const getQueryUniqueId = (dataSource: DataSource) =>
+      getSessionId() + '_' + activeTabId + '_' + dataSource.id;
+
     const constructQueryRequest = (
-      dataSource: DataSource
+      dataSource: DataSource,
+      forceRefresh: boolean = false
     ): QueryRequest | null => {
-      // sessionId + tabId + dataSourceId (标识此处请求是唯一的)
-      const uniqueId = getSessionId() + '_' + activeTabId + '_' + dataSource.id;
+      const uniqueId = getQueryUniqueId(dataSource);
 
       // cascader context: 级联参数
       let cascaderRequired: string[] = [];
@@ -279,12 +297,20 @@ export const ParameterQueryArea = memo(
           values,
           parameters || []
         );
+        // results 引擎: 其他数据源的别名 -> 查询结果ID，后端只使用查询中引用到的别名
+        const dfAliasUniqueIds: Record<string, string> = {};
+        dataSources?.forEach((ds) => {
+          if (ds.id !== dataSource.id) {
+            dfAliasUniqueIds[ds.alias] = getQueryUniqueId(ds);
+          }
+        });
         requestContext = {
           type: 'sql',
           engine: dataSource.executor.engine,
           code: dataSource.executor.code,
           parsedCode: code,
           paramValues: values,
+          dfAliasUniqueIds: dfAliasUniqueIds,
         };
       } else if (dataSource.executor.type === 'python') {
         const code = replaceParametersInCode(
@@ -326,13 +352,17 @@ export const ParameterQueryArea = memo(
         inferredContext: {
           required: inferredRequired,
         },
+        forceRefresh: forceRefresh,
       } as QueryRequest;
 
       return queryRequest;
     };
 
-    const handleQueryRequest = async (dataSource: DataSource) => {
-      const queryRequest = constructQueryRequest(dataSource);
+    const handleQueryRequest = async (
+      dataSource: DataSource,
+      forceRefresh: boolean = false
+    ) => {
+      const queryRequest = constructQueryRequest(dataSource, forceRefresh);
 
       if (!queryRequest) {
         toast.error(
@@ -373,7 +403,15 @@ export const ParameterQueryArea = memo(
 
     const handleSubmit = (e: React.FormEvent) => {
       e.preventDefault();
+      submitQuery(false);
+    };
 
+    // 刷新: 与查询相同，但不复用后端缓存的结果
+    const handleRefresh = () => {
+      submitQuery(true);
+    };
+
+    const submitQuery = (forceRefresh: boolean) => {
       if (!activeTabId) {
         toast.error('请先打开一个标签页');
         return;
@@ -422,7 +460,7 @@ export const ParameterQueryArea = memo(
       //   return;
       // }
 
-      handleQuerySubmit();
+      handleQuerySubmit(forceRefresh);
     };
 
     // 多输入框键盘事件处理
@@ -770,6 +808,16 @@ export const ParameterQueryArea = memo(
                   >
                     查询
                   </Button>
+                  <Button
+                    variant='outline'
+                    size='sm'
+                    className='h-8 w-15 px-2'
+                    onClick={handleRefresh}
+                    disabled={isQuerying}
+                    type='button'
+                  >
+                    刷新
+                  </Button>
                   <Button
                     variant='outline'
                     size='sm'
@@ -1,4 +1,4 @@
-import type { Alert } from './queryResponse';
+import type { Alert, LimitExceeded } from './queryResponse';
 
 export interface ArtifactRequest {
   uniqueId: string;
@@ -8,6 +8,8 @@ export interface ArtifactRequest {
   inferredParamValues?: Record<string, string | string[]>;
   pyCode: string;
   engine: string;
+  timeout?: number;
+  forceRefresh?: boolean;
 }
 
 export interface PlainParamValue {
@@ -78,6 +80,8 @@ export interface ArtifactResponse {
     | ArtifactEChartDataContext
     | ArtifactAltairDataContext
     | ArtifactPerspectiveDataContext;
+  limitExceeded?: LimitExceeded | null;
+  cacheHit?: boolean;
 }
 
 export interface ArtifactCodeReponse {
@@ -7,6 +7,8 @@ export interface QueryBySQLRequestContext {
   code: string;
   parsedCode: string;
   paramValues?: { [key: string]: any };
+  timeout?: number;
+  dfAliasUniqueIds?: Record<string, string>;
 }
 
 export interface QueryByPythonRequestContext {
@@ -18,6 +20,7 @@ export interface QueryByPythonRequestContext {
   code: string;
   parsedCode: string;
   paramValues?: { [key: string]: any };
+  timeout?: number;
 }
 
 export interface QueryByCsvDataRequestContext {
@@ -54,4 +57,5 @@ export interface QueryRequest {
     | QueryByCsvUploadRequestContext;
   cascaderContext?: CascaderContext;
   inferredContext?: InferredContext;
+  forceRefresh?: boolean;
 }
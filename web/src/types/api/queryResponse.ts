@@ -5,6 +5,11 @@ export interface Alert {
   message: string;
 }
 
+export interface LimitExceeded {
+  limit: 'memory' | 'cpu' | 'wall' | 'output';
+  value: number;
+}
+
 export interface QueryResponseDataContext {
   rowNumber: number;
   demoData: string;
@@ -32,4 +37,7 @@ export interface QueryResponse {
   cascaderContext: CascaderContext;
   inferredContext: InferredContext;
   queryTime: string;
+  cacheHit?: boolean;
+  cacheAge?: number | null;
+  limitExceeded?: LimitExceeded | null;
 }
@@ -8,6 +8,14 @@ import {
   upsertAliasRelianceMapByDataSource,
 } from './aliasRelianceMap';
 
+// Python 代码的资源限制，未设置的项使用引擎配置
+export interface ExecutionLimits {
+  memoryMb?: number;
+  cpuSeconds?: number;
+  wallSeconds?: number;
+  outputMb?: number;
+}
+
 // 主要响应接口
 export interface Report {
   id: string; // 自动生成
@@ -17,6 +25,7 @@ export interface Report {
   parameters: Parameter[]; // 使用之前定义的 Parameter 接口
   artifacts: Artifact[];
   layout: Layout;
+  limits?: ExecutionLimits;
   createdAt: string;
   updatedAt: string;
 }